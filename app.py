@@ -1,357 +1,592 @@
-from flask import Flask, render_template, request, session, redirect, url_for
-import base64
+from flask import Flask, render_template, request, session, redirect, url_for, jsonify, send_file, abort, Response, stream_with_context, g
+import hashlib
+import hmac
+import json
 import os
 import io
+import uuid
+import zipfile
+from concurrent.futures import as_completed
 
 from datetime import timedelta
 # 引入原始腳本中的函式
 import sys
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin, urlparse, quote
 import time
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageFont
 import textwrap
-from scraper import Scraper
+from scraper import Scraper, ArticleRecord
 import re # 將 re 模組的導入移到檔案頂部
-from config import LAYOUT_CONFIG
+from config import LAYOUT_CONFIG, CACHE_CONFIG, BATCH_CONFIG, JOB_CONFIG, PROFILE_CONFIG, METRICS_CONFIG
+from fonts import FontRegistry, get_line_breaker
+from assets import BackgroundTemplate, CaptionRenderer
+from layout import LayoutEngine, NO_IMAGE
+from cache import LRUCache, estimate_image_bytes
+from shared_cache import SharedCache
+from fetcher import ImageFetcher
+from http_client import get_http_client
+from batch import BatchScraper
+from render_pool import RenderPool
+from jobs import JobQueue, QueueFull
+from timing import NULL_TIMER, PhaseTimer, current_timer, set_timer, reset_timer, use_timer
+from metrics import Registry
+from profiling import RequestProfiler
+from encoder import FORMATS, DEFAULT_OUTPUT, OutputFormat, sniff_mimetype
 from functools import wraps
 
 # 取得目前檔案所在的目錄
 APP_ROOT = os.path.dirname(os.path.abspath(__file__))
 
-def get_font(size, bold=False):
-    """獲取思源黑體字體"""
-    # 根據 bold 參數從 config 讀取對應的字體檔案名稱
+# 每個 worker 共用的字體快取
+font_registry = FontRegistry(max_entries=CACHE_CONFIG['font_max_entries'])
+
+# 每個 worker 共用的背景底圖範本（已解碼並縮放至版面尺寸）
+background_template = BackgroundTemplate(os.path.join(APP_ROOT, 'static'))
+
+# 資料來源文字（描邊白字）的圖塊快取
+caption_renderer = CaptionRenderer(max_entries=CACHE_CONFIG['caption_max_entries'])
+
+# --- 記憶體快取：已解析網頁與已下載圖片分別計算額度 ---
+CACHE_TTL = CACHE_CONFIG['ttl']  # 快取存活時間（秒）
+page_cache = LRUCache('pages', CACHE_CONFIG['page_max_entries'], CACHE_CONFIG['page_max_bytes'], CACHE_TTL,
+                      sizeof=lambda record: record.estimate_bytes())
+image_bytes_cache = LRUCache('image_bytes', CACHE_CONFIG['image_bytes_max_entries'], CACHE_CONFIG['image_bytes_max_bytes'],
+                             CACHE_TTL, sizeof=len)
+# 已縮放成版面尺寸的圖片，以 (圖片網址, (寬, 高)) 為鍵
+image_cache = LRUCache('images', CACHE_CONFIG['image_max_entries'], CACHE_CONFIG['image_max_bytes'], CACHE_TTL,
+                       sizeof=estimate_image_bytes)
+
+# --- 跨 worker 共用的磁碟快取：文章擷取紀錄與圖片原始位元組 ---
+shared_cache = None
+if CACHE_CONFIG['shared_cache_path']:
+    shared_cache = SharedCache(CACHE_CONFIG['shared_cache_path'], {
+        'articles': {'ttl': CACHE_CONFIG['shared_article_ttl'], 'max_bytes': CACHE_CONFIG['shared_article_max_bytes']},
+        'images': {'ttl': CACHE_CONFIG['shared_image_ttl'], 'max_bytes': CACHE_CONFIG['shared_image_max_bytes']},
+        'renders': {'ttl': CACHE_CONFIG['shared_render_ttl'], 'max_bytes': CACHE_CONFIG['shared_render_max_bytes']},
+        'jobs': {'ttl': JOB_CONFIG['ttl'], 'max_bytes': JOB_CONFIG['shared_max_bytes']},
+    })
+
+# 最終排版圖的快取：(已編碼的位元組, 當初的編碼秒數)
+render_cache = LRUCache('renders', CACHE_CONFIG['render_max_entries'], CACHE_CONFIG['render_max_bytes'], CACHE_TTL,
+                        sizeof=lambda entry: len(entry[0]))
+
+def _no_progress(stage):
+    pass
+
+def get_article_record(url, progress=_no_progress, refresh=False):
+    """
+    依序從記憶體快取、共用磁碟快取取得文章紀錄，都未命中時才實際抓取；refresh 為 True 時一律重新抓取。
+    實際抓取時會在下載網頁（fetch）與解析擷取（extract）前呼叫 progress。
+    """
+    record = None if refresh else lookup_article_record(url)
+    if record is None:
+        print(f"CACHE MISS for URL: {url}")
+        timer = current_timer()
+        progress('fetch')
+        timer.restart()
+        html = Scraper.fetch_html(Scraper._validate_url(url))
+        timer.mark('fetch')
+        progress('extract')
+        scraper = Scraper.from_html(url, html)
+        timer.mark('parse')
+        record = scraper.extract_record()
+        timer.mark('extract')
+        remember_article_record(url, record)
+    return record
+
+def lookup_article_record(url):
+    """只從快取取得文章紀錄，未命中時回傳 None"""
+    record = page_cache.get(url)
+    if record is not None:
+        print(f"CACHE HIT for URL: {url}")
+        return record
+
+    data = shared_cache.get('articles', url) if shared_cache else None
+    if data is None:
+        return None
+    print(f"SHARED CACHE HIT for URL: {url}")
+    record = ArticleRecord.from_json(data.decode('utf-8'))
+    page_cache.set(url, record)
+    return record
+
+def remember_article_record(url, record):
+    """將新擷取的文章紀錄存入記憶體與共用磁碟快取"""
+    if shared_cache:
+        shared_cache.set('articles', url, record.to_json().encode('utf-8'))
+    page_cache.set(url, record)
+
+def get_image_bytes(image_url):
+    """依序從記憶體、共用磁碟快取取得圖片原始位元組，未命中時下載（只快取可辨識的圖片）"""
+    data = image_bytes_cache.get(image_url)
+    if data is not None:
+        return data
+    data = shared_cache.get('images', image_url) if shared_cache else None
+    if data is None:
+        data = Scraper.download_image_bytes(image_url)
+        if data is None or Scraper.open_image(data) is None:
+            return None
+        if shared_cache:
+            shared_cache.set('images', image_url, data)
+    image_bytes_cache.set(image_url, data)
+    return data
+
+def get_fitted_image(image_url, size):
+    """
+    取得縮放成 size 的圖片。JPEG 會先在解碼時直接縮小到接近目標尺寸（draft），
+    再以 LANCZOS 完成最後的縮放，解碼時間與記憶體都遠小於完整解碼。
+    """
+    key = (image_url, size)
+    image = image_cache.get(key)
+    if image is not None:
+        return image
+    data = get_image_bytes(image_url)
+    image = Scraper.open_image(data, draft_size=size) if data is not None else None
+    if image is None:
+        return None
+    try:
+        image = image.resize(size, Image.Resampling.LANCZOS)
+    except Exception:
+        return None
+    image_cache.set(key, image)
+    return image
+
+# 圖片並行下載與背景預取
+image_fetcher = ImageFetcher(get_image_bytes, max_workers=CACHE_CONFIG['image_fetch_workers'],
+                             prefetch_workers=CACHE_CONFIG['image_prefetch_workers'])
+
+def fetch_fitted_images(image_urls, size):
+    """同時下載多張圖片後再各自解碼縮放，空網址或失敗時對應位置為 None"""
+    image_fetcher.fetch_many([url for url in image_urls if url and (url, size) not in image_cache])
+    return [get_fitted_image(url, size) if url else None for url in image_urls]
+
+def prefetch_article_images(record):
+    """在背景預先下載文章中尚未快取的圖片，之後切換雙框圖片時不需再等待下載"""
+    image_fetcher.prefetch([image_url for image_url, _ in record.images if image_url not in image_bytes_cache])
+
+def _font_path(bold=False):
+    """依 bold 參數取得思源黑體的完整路徑"""
     if bold and LAYOUT_CONFIG['title'].get('font_path_bold'):
         font_filename = LAYOUT_CONFIG['title']['font_path_bold']
     else:
-        # 假設有一個常規字體的設定，如果沒有，則使用一個預設值
         font_filename = LAYOUT_CONFIG['title'].get('font_path_regular', 'NotoSansTC-Regular.ttf')
+    return os.path.join(APP_ROOT, 'static', font_filename)
 
-    font_path = os.path.join(APP_ROOT, 'static', font_filename)
+def get_font(size, bold=False):
+    """獲取思源黑體字體（經由字體快取）"""
+    font_path = _font_path(bold)
     try:
-        return ImageFont.truetype(font_path, size)
+        return font_registry.truetype(font_path, size)
     except IOError:
         print(f"警告: 無法在 '{font_path}' 找到字體檔案，將使用預設字體。")
         return ImageFont.load_default()
 
+def get_source_font():
+    """獲取資料來源文字使用的字體，找不到時退回思源黑體"""
+    image_cfg = LAYOUT_CONFIG['image']
+    source_font_path = os.path.join(APP_ROOT, 'static', image_cfg['source_text_font_path'])
+    try:
+        return font_registry.truetype(source_font_path, image_cfg['source_text_font_size'])
+    except (OSError, IOError, ValueError) as e:
+        print(f"警告：無法載入指定的來源字體 {source_font_path}，將使用預設字體。錯誤：{e}")
+        return get_font(image_cfg['source_text_font_size'])
+
+def preload_layout_fonts():
+    """在啟動時預先載入 LAYOUT_CONFIG 會用到的字體大小"""
+    cfg = LAYOUT_CONFIG
+    regular = _font_path(bold=False)
+    font_registry.preload([
+        (regular, cfg['title']['base_font_size']),
+        (regular, cfg['content']['font_size']),
+        (regular, 24),  # 雙框圖片載入失敗提示
+        (regular, 32),  # 圖片載入失敗 / 無圖片提示
+        (os.path.join(APP_ROOT, 'static', cfg['image']['source_text_font_path']), cfg['image']['source_text_font_size']),
+    ])
+
 def wrap_text(text, font, max_width):
     """文字換行處理"""
-    lines = []
-    words = list(text)
-    current_line = ""
-    
-    for word in words:
-        test_line = current_line + word
-        bbox = font.getbbox(test_line)
-        width = bbox[2] - bbox[0]
-        
-        if width <= max_width:
-            current_line = test_line
-        else:
-            if current_line:
-                lines.append(current_line)
-            current_line = word
-    
-    if current_line:
-        lines.append(current_line)
-    
-    return lines
+    return get_line_breaker(font).wrap(text, max_width)
 
-def create_layout_image(data, show_source=True, dual_image_data=None):
-    """創建自動排版圖片"""
-    
-    # 從設定檔讀取參數
+def create_layout_image(data, show_source=True, dual_image_data=None, timer=NULL_TIMER, progress=_no_progress):
+    """
+    創建自動排版圖片（見 layout.LayoutEngine：先量測版面，再合成分別快取的圖層），
+    回傳 (圖片, 所有圖片是否都成功載入)；背景底圖無法載入時圖片為 None。
+    timer 會依序記錄 measure、download、background、title、content、image、caption 各階段的耗時（見 timing.PhaseTimer），
+    下載圖片與開始繪製前會呼叫 progress('download')、progress('render')。
+    """
+    return layout_engine.render(data, show_source=show_source, dual_image_data=dual_image_data, timer=timer,
+                                progress=progress)
+
+def _layout_fingerprint():
+    """版面設定與素材檔案（底圖、字體）的指紋，任何一項變更都會讓舊的排版快取失效"""
     cfg = LAYOUT_CONFIG
-    
+    parts = [json.dumps(cfg, sort_keys=True, ensure_ascii=False)]
+    for filename in (cfg['layout']['background_path'], cfg['title'].get('font_path_regular', 'NotoSansTC-Regular.ttf'),
+                     cfg['title'].get('font_path_bold', ''), cfg['image']['source_text_font_path']):
+        try:
+            stat = os.stat(os.path.join(APP_ROOT, 'static', filename))
+            parts.append(f"{filename}:{stat.st_mtime_ns}:{stat.st_size}")
+        except OSError:
+            parts.append(f"{filename}:missing")
+    return '|'.join(parts)
+
+# 排版引擎：標題與內文的量測結果與文字圖層、以及不含圖說的底圖各自快取
+layout_engine = LayoutEngine(
+    LAYOUT_CONFIG, get_font, get_source_font, fetch_fitted_images, background_template, caption_renderer,
+    # 量測結果只是幾行文字，只限制項目數量（sizeof 預設為 0）
+    measure_cache=LRUCache('layout_measures', CACHE_CONFIG['layout_measure_max_entries'], 0, CACHE_TTL),
+    layer_cache=LRUCache('layers', CACHE_CONFIG['layer_max_entries'], CACHE_CONFIG['layer_max_bytes'], CACHE_TTL,
+                         sizeof=lambda layer: estimate_image_bytes(layer[0])),
+    base_cache=LRUCache('layout_bases', CACHE_CONFIG['layout_base_max_entries'], CACHE_CONFIG['layout_base_max_bytes'],
+                        CACHE_TTL, sizeof=estimate_image_bytes),
+    fingerprint=_layout_fingerprint)
+
+def render_cache_key(data, show_source, dual_image_data=None, output=DEFAULT_OUTPUT):
+    """以所有繪圖輸入與輸出設定計算排版圖快取的鍵"""
+    if dual_image_data:
+        inputs = {key: dual_image_data.get(key) for key in
+                  ('title', 'content', 'alt_text', 'img1_url', 'img2_url', 'img1_idx', 'img2_idx')}
+        inputs['dual_image'] = True
+    else:
+        inputs = {key: data.get(key) for key in ('title', 'content', 'image_url', 'alt_text')}
+    inputs['show_source'] = bool(show_source)
+    inputs['layout'] = _layout_fingerprint()
+    inputs['output'] = output.cache_key()
+    payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _layout_image_urls(data, dual_image_data=None):
+    """排版圖用到的圖片網址"""
+    if dual_image_data:
+        return [url for url in (dual_image_data.get('img1_url'), dual_image_data.get('img2_url')) if url]
+    image_url = data.get('image_url', '')
+    return [image_url] if image_url and image_url != NO_IMAGE else []
+
+def render_layout(data, show_source=True, dual_image_data=None, output=DEFAULT_OUTPUT, progress=_no_progress,
+                  refresh=False):
+    """
+    產生排版圖並依 output（encoder.OutputFormat）編碼，回傳 (render_id, 圖片位元組, 編碼秒數)；
+    取自快取時編碼秒數為當初編碼所花的時間（沒有紀錄時為 None）。
+    render_id 為輸入雜湊值，相同輸入會直接取得快取結果（refresh 為 True 時略過快取重新繪製）；
+    圖片下載失敗時產生的替代版面改用一次性的 render_id，不會被之後的請求重用。
+    未命中快取時會在下載圖片（download）、繪製（render）與編碼（encode）前呼叫 progress
+    （底圖取自排版引擎的快取時不需要下載圖片，沒有 download）。
+    """
+    key = render_cache_key(data, show_source, dual_image_data, output)
+    image_bytes, encode_seconds = (None, None) if refresh else lookup_rendered_image(key)
+    if image_bytes is not None:
+        print(f"RENDER CACHE HIT: {key[:12]}")
+        return key, image_bytes, encode_seconds
+
+    timer = current_timer()
+    timer.restart()
+    layout_image, images_loaded = create_layout_image(data, show_source=show_source, dual_image_data=dual_image_data,
+                                                      timer=timer, progress=progress)
+    if layout_image is None:
+        return None, None, None
+
+    progress('encode')
+    timer.restart()
+    image_bytes, encode_seconds = output.encode(layout_image)
+    timer.mark('encode')
+
+    if not images_loaded:
+        key = uuid.uuid4().hex
+    store_rendered_image(key, image_bytes, encode_seconds)
+    return key, image_bytes, encode_seconds
+
+def store_rendered_image(render_id, image_bytes, encode_seconds=None):
+    """
+    保存排版圖與編碼時間，讓 /rendered 路由可由任何 worker 取得，之後命中快取時也能回報當初的編碼時間。
+    共用快取中的編碼時間另存在 "<render_id>.json"。
+    """
+    render_cache.set(render_id, (image_bytes, encode_seconds))
+    if shared_cache:
+        shared_cache.set('renders', render_id, image_bytes)
+        shared_cache.set('renders', f"{render_id}.json",
+                         json.dumps({'encode_seconds': encode_seconds}).encode('utf-8'))
+
+def lookup_rendered_image(render_id):
+    """依 render_id 取得 (已編碼的排版圖, 編碼秒數)；找不到時圖片為 None，沒有編碼時間的紀錄時秒數為 None"""
+    entry = render_cache.get(render_id)
+    if entry is not None:
+        return entry
+    if not shared_cache:
+        return None, None
+    image_bytes = shared_cache.get('renders', render_id)
+    if image_bytes is None:
+        return None, None
+    meta = shared_cache.get('renders', f"{render_id}.json")
+    encode_seconds = json.loads(meta.decode('utf-8')).get('encode_seconds') if meta is not None else None
+    render_cache.set(render_id, (image_bytes, encode_seconds))
+    return image_bytes, encode_seconds
+
+def get_rendered_image(render_id):
+    """依 render_id 取得已編碼的排版圖，找不到時回傳 None"""
+    return lookup_rendered_image(render_id)[0]
+
+def rendered_image_url(render_id, output, **kwargs):
+    return url_for('rendered_image', render_id=render_id, ext=output.extension, **kwargs)
+
+def output_report(output, image_bytes, encode_seconds):
+    """回報給使用者的輸出資訊：格式設定、檔案大小與編碼時間（取自快取且沒有紀錄時為 None）"""
+    return {
+        'output': output.to_dict(),
+        'size': len(image_bytes),
+        'encode_seconds': round(encode_seconds, 4) if encode_seconds is not None else None,
+    }
+
+def build_layout_data(record, url, dual_image=False, image_index_1=1, image_index_2=2,
+                      edited_title=None, edited_content=None, edited_alt_text=None):
+    """
+    依文章紀錄與使用者選項準備繪圖資料，回傳 (result, dual_image_data)；
+    單張圖片模式時 dual_image_data 為 None。選項不正確時拋出 ValueError，訊息可直接顯示給使用者。
+    """
+    if dual_image:
+        # 雙框圖片模式
+        try:
+            img1_idx = int(image_index_1)
+            img2_idx = int(image_index_2)
+        except (ValueError, TypeError):
+            raise ValueError("圖片索引必須是數字。")
+
+        all_images = record.content_images()
+        if min(img1_idx, img2_idx) < 1:
+            raise ValueError(f"圖片索引必須從 1 開始 (共 {len(all_images)} 張)。")
+        if len(all_images) < max(img1_idx, img2_idx):
+            raise ValueError(f"文章圖片數量不足 (共 {len(all_images)} 張)，無法選取第 {max(img1_idx, img2_idx)} 張圖。")
+
+        dual_image_data = {
+            'title': edited_title if edited_title is not None else record.title,
+            'content': edited_content if edited_content is not None else record.content,
+            'img1_url': all_images[img1_idx - 1]['image_url'],
+            'alt_text': edited_alt_text if edited_alt_text is not None else all_images[img1_idx - 1]['alt_text'],
+            'img2_url': all_images[img2_idx - 1]['image_url'],
+            'img1_idx': img1_idx,
+            'img2_idx': img2_idx,
+            'url': url # 將當前 url 傳遞給繪圖函式以利快取
+        }
+        # 雙框模式的 result 與 dual_image_data 是同一份資料
+        return dual_image_data, dual_image_data
+
+    # 單張圖片模式：重新生成時使用編輯過的文字，圖片網址仍來自文章紀錄
+    result = record.to_dict()
+    if edited_title is not None:
+        result['title'] = edited_title
+    if edited_content is not None:
+        result['content'] = edited_content
+    if edited_alt_text is not None:
+        result['alt_text'] = edited_alt_text
+    return result, None
+
+# --- 背景排版工作 ---
+
+def run_render_job(options, progress):
+    """
+    在背景執行緒中執行一個排版工作，options 與 /api/render 的輸入相同；
+    options['profile'] 為真（或被抽樣）時剖析這個工作，結果中附上 profile_id。
+    """
+    timer = PhaseTimer()
     try:
-        # 假設背景圖片也放在 'static' 資料夾中
-        background_path = os.path.join(APP_ROOT, 'static', cfg['layout']['background_path'])
-        background = Image.open(background_path)
-        
-        if background.size != (cfg['layout']['width'], cfg['layout']['height']):
-            background = background.resize((cfg['layout']['width'], cfg['layout']['height']), Image.Resampling.LANCZOS)
-            
-    except FileNotFoundError:
-        background = Image.new('RGB', (cfg['layout']['width'], cfg['layout']['height']), color='white')
-        print(f"警告: 找不到背景圖片 {background_path}，已使用白色背景替代。")
-    except Exception as e:
-        return None
-    
-    draw = ImageDraw.Draw(background)
-    
-    # 版面區域變數
-    start_x = cfg['layout']['white_area_left']
-    current_y = cfg['layout']['white_area_top']
-    white_area_width = cfg['layout']['white_area_width']
-    white_area_height = cfg['layout']['white_area_height']
-    header_height = cfg['layout']['header_height']
-    
-    # 1. 繪製標題區域
-    title_cfg = cfg['title']
-    title_font = get_font(title_cfg['base_font_size'], bold=False)
-    title_text = data.get('title', '未找到標題')
+        with use_timer(timer):
+            result, profile_id = run_profiled(options['url'], options.get('profile'), _run_render_job, options, progress)
+            if profile_id:
+                result['profile_id'] = profile_id
+            return result
+    finally:
+        observe_stages(timer, 'job')
 
-    # 先用基本字體計算分行，以判斷是單行還是多行
-    title_lines_initial_wrap = wrap_text(title_text, title_font, white_area_width - title_cfg['horizontal_padding']) 
+def _run_render_job(options, progress, refresh=False):
+    url = options['url']
+    output = OutputFormat.from_options(options.get('output'))
+    record = get_article_record(url, progress=progress, refresh=refresh)
+    result, dual_image_data = build_layout_data(
+        record, url, dual_image=bool(options.get('dual_image')),
+        image_index_1=options.get('image_index_1', 1), image_index_2=options.get('image_index_2', 2),
+        edited_title=options.get('edited_title'), edited_content=options.get('edited_content'),
+        edited_alt_text=options.get('edited_alt_text'))
+    render_id, image_bytes, encode_seconds = render_layout(
+        result, show_source=bool(options.get('show_source')), dual_image_data=dual_image_data,
+        output=output, progress=progress, refresh=refresh)
+    prefetch_article_images(record)
+    if render_id is None:
+        raise ValueError("圖片創建失敗，請檢查底圖或字體檔案。")
+    return dict({
+        'render_id': render_id,
+        'title': result['title'],
+        'content': result['content'],
+        'alt_text': result['alt_text'],
+    }, **output_report(output, image_bytes, encode_seconds))
 
-    # 計算標題文字在其預留區域內的可用垂直空間
-    available_title_content_height = header_height
+job_queue = JobQueue(run_render_job, max_workers=JOB_CONFIG['workers'], ttl=JOB_CONFIG['ttl'],
+                     max_jobs=JOB_CONFIG['max_jobs'], max_pending=JOB_CONFIG['max_pending'],
+                     shared_cache=shared_cache)
 
-    if len(title_lines_initial_wrap) == 1:
-        s_cfg = title_cfg['single_line']
-        single_line_text = title_lines_initial_wrap[0]
-        
-        # 獲取初始字體大小下的文字尺寸
-        initial_font_bbox = title_font.getbbox(single_line_text)
-        current_text_width_at_initial_size = initial_font_bbox[2] - initial_font_bbox[0]
+def render_options_from_form(form):
+    """將 /generate_image 表單欄位轉為與 JSON API 相同的選項格式"""
+    options = {
+        'url': form.get('url'),
+        'show_source': form.get('show_source') == 'on',
+        'dual_image': form.get('dual_image') == 'on',
+        'image_index_1': form.get('image_index_1', 1),
+        'image_index_2': form.get('image_index_2', 2),
+        'profile': form.get('profile') == '1',
+    }
+    for key in ('edited_title', 'edited_content', 'edited_alt_text'):
+        if form.get(key) is not None:
+            options[key] = form.get(key)
+    options['output'] = output_options_from_form(form)
+    return options
 
-        available_horizontal_space = white_area_width - title_cfg['horizontal_padding']
+def output_options_from_form(form):
+    """表單中的輸出設定欄位，格式與 JSON API 的 output 物件相同"""
+    return {
+        'format': form.get('output_format'),
+        'quality': form.get('quality'),
+        'compress_level': form.get('compress_level'),
+        'subsampling': form.get('subsampling'),
+        'preview': form.get('preview') == 'on',
+    }
 
-        final_font_size_for_single_line = title_cfg['base_font_size']
-        
-        # 如果單行文字在初始字體大小下太短，則嘗試放大字體
-        if current_text_width_at_initial_size < available_horizontal_space * s_cfg['fill_percentage']:
-            # 計算需要的縮放因子
-            scale_factor = (available_horizontal_space * s_cfg['fill_percentage']) / current_text_width_at_initial_size
-            final_font_size_for_single_line = min(int(title_cfg['base_font_size'] * scale_factor), title_cfg['max_font_size'])
-        
-        # 獲取最終用於繪製的字體（可能已放大）
-        actual_drawing_font = get_font(final_font_size_for_single_line, bold=False)
-        
-        # 重新計算原始文字的寬高，使用調整後的字體大小
-        text_bbox = actual_drawing_font.getbbox(single_line_text)
-        original_text_width = text_bbox[2] - text_bbox[0]
-        original_text_height = text_bbox[3] - text_bbox[1]
-        
-        if original_text_height > 0:
-            target_stretched_content_height = int(original_text_height * s_cfg['vertical_stretch_factor'])
-            max_allowed_stretched_height = available_title_content_height * s_cfg['max_stretch_factor']
-            target_stretched_content_height = min(target_stretched_content_height, int(max_allowed_stretched_height))
-
-            padding_h = s_cfg['temp_image_padding_h']
-            padding_v = s_cfg['temp_image_padding_v']
-
-            temp_img = Image.new('RGBA', 
-                                     (original_text_width + padding_h, 
-                                      original_text_height + padding_v), 
-                                     (255, 255, 255, 0))
-            temp_draw = ImageDraw.Draw(temp_img)
-            
-            temp_draw.text((padding_h // 2, padding_v // 2), single_line_text, font=actual_drawing_font, fill='black')
-
-            new_scaled_height_of_temp_img = int(target_stretched_content_height + padding_v)
-            scaled_img_width = temp_img.width 
-            
-            scaled_img = temp_img.resize((scaled_img_width, new_scaled_height_of_temp_img), Image.Resampling.LANCZOS)
-            
-            paste_x = start_x + (white_area_width - scaled_img.width) // 2
-            paste_y = (current_y + s_cfg['vertical_offset']) + (available_title_content_height - scaled_img.height) // 2
-            
-            background.paste(scaled_img, (paste_x, paste_y), scaled_img) 
-        else:
-            text_x = start_x + (white_area_width - original_text_width) // 2
-            text_y = (current_y + s_cfg['vertical_offset']) + (available_title_content_height - original_text_height) // 2 
-            draw.text((text_x, text_y), single_line_text, font=actual_drawing_font, fill='black')
-            
-        current_y += header_height 
-
-    else: # 多行標題的處理 (使用基本字體)
-        title_y = current_y + title_cfg['vertical_offset_multiline']
-        
-        for line in title_lines_initial_wrap[:2]: # 僅顯示前兩行
-            text_x = start_x + (title_cfg['horizontal_padding'] / 2)
-            draw.text((text_x, title_y), line, font=title_font, fill='black')
-            title_y += title_cfg['base_font_size'] * title_cfg['line_height_multiplier']
-        
-        current_y += header_height 
-    
-    # 2. 計算內容實際需要的高度
-    content_cfg = cfg['content']
-    content_font = get_font(content_cfg['font_size'])
-    content_text = data.get('content', '未找到內容')
-    content_lines = wrap_text(content_text, content_font, white_area_width - title_cfg['horizontal_padding'])
-    
-    content_actual_height = content_cfg['top_padding'] + (len(content_lines) * content_cfg['line_height']) + content_cfg['bottom_padding']
-    
-    # 3. 繪製內容區域（動態高度）
-    content_y = current_y + content_cfg['top_padding']
-    
-    for line in content_lines:
-        draw.text((start_x + (title_cfg['horizontal_padding'] / 2), content_y), line, font=content_font, fill='black')
-        content_y += content_cfg['line_height']
-    
-    current_y += content_actual_height
-    
-    # 4. 添加間距
-    current_y += cfg['layout']['content_image_gap']
-    
-    # 5. 計算圖片區域高度（剩餘空間）
-    image_cfg = cfg['image']
-    remaining_height = cfg['layout']['white_area_top'] + white_area_height - current_y
-    image_height = max(image_cfg['min_height'], remaining_height)
-    
-    # 如果計算出的高度太小，調整佈局
-    if image_height < image_cfg['min_height_for_full_content']:
-        max_content_lines = min(len(content_lines), content_cfg['max_lines_when_cramped'])
-        content_actual_height = content_cfg['top_padding'] + (max_content_lines * content_cfg['line_height']) + content_cfg['bottom_padding']
-        
-        draw.rectangle([start_x, cfg['layout']['white_area_top'] + header_height, start_x + white_area_width, cfg['layout']['white_area_top'] + white_area_height], fill='white')
-        
-        current_y = cfg['layout']['white_area_top'] + header_height
-        content_y = current_y + content_cfg['top_padding']
-        
-        for line in content_lines[:max_content_lines]:
-            draw.text((start_x + (title_cfg['horizontal_padding'] / 2), content_y), line, font=content_font, fill='black')
-            content_y += content_cfg['line_height']
-        
-        if len(content_lines) > max_content_lines:
-            draw.text((start_x + (title_cfg['horizontal_padding'] / 2), content_y), "...", font=content_font, fill='black')
-        
-        current_y += content_actual_height + cfg['layout']['content_image_gap']
-        image_height = cfg['layout']['white_area_top'] + white_area_height - current_y
-    
-    # 6. 繪製圖片區域（動態高度）
-    # <<<< 修正：雙框圖片邏輯 >>>>
-    if dual_image_data:
-        img1_url = dual_image_data.get('img1_url')
-        img2_url = dual_image_data.get('img2_url')
-        img1_idx = dual_image_data.get('img1_idx')
-        img2_idx = dual_image_data.get('img2_idx')
-    
-        # 修正：從快取中獲取圖片，避免重新下載
-        cached_images = url_cache.get(dual_image_data.get('url'), {}).get('images', {})
-        
-        img1 = cached_images.get(img1_url)
-        if not img1 and img1_url:
-            img1 = Scraper.download_image(img1_url)
-            cached_images[img1_url] = img1
-
-        img2 = cached_images.get(img2_url)
-        if not img2 and img2_url:
-            img2 = Scraper.download_image(img2_url)
-            cached_images[img2_url] = img2
-    
-        # 計算每張圖片的寬度和間距
-        gap = image_cfg['dual_image_gap']
-        img_width = (white_area_width - gap) // 2
-        img_height = image_height
-    
-        # 貼上第一張圖
-        if img1:
-            img1_resized = img1.resize((img_width, img_height), Image.Resampling.LANCZOS)
-            background.paste(img1_resized, (start_x, current_y))
-        else:
-            draw.rectangle([start_x, current_y, start_x + img_width, current_y + img_height], fill='grey')
-            draw.text((start_x + 20, current_y + 20), f"圖 {img1_idx} 載入失敗", font=get_font(24), fill='white')
-    
-        # 貼上第二張圖
-        if img2:
-            img2_resized = img2.resize((img_width, img_height), Image.Resampling.LANCZOS)
-            background.paste(img2_resized, (start_x + img_width + gap, current_y))
-        else:
-            draw.rectangle([start_x + img_width + gap, current_y, start_x + white_area_width, current_y + img_height], fill='grey')
-            draw.text((start_x + img_width + gap + 20, current_y + 20), f"圖 {img2_idx} 載入失敗", font=get_font(24), fill='white')
-    
-        # <<<< 修正：只有勾選「含資料來源」時才繪製文字 >>>>
-        if show_source:
-            # 優先使用第一張圖的 alt_text，如果不存在則使用 "圖X跟圖X" 作為備用
-            source_text = dual_image_data.get('alt_text')
-            if not source_text or source_text in ['無替代文字', '未找到圖片或無替代文字']:
-                source_text = f"圖{img1_idx}跟圖{img2_idx}"
-            
+# --- 批次繪製 ---
+
+# 批次繪製用的行程池，第一次批次請求時才啟動
+render_pool = RenderPool(max_workers=BATCH_CONFIG['render_workers'])
+
+def render_layout_job(data, show_source, dual_image_data, output):
+    """在行程池的子行程中執行，回傳 (render_id, 圖片位元組, 編碼秒數)"""
+    return render_layout(data, show_source=show_source, dual_image_data=dual_image_data, output=output)
+
+class _ZipStream:
+    """只支援寫入的緩衝區，讓 zipfile 邊寫邊輸出（zipfile 會自行記錄位移並寫入資料描述區）"""
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_layout_zip(jobs, failures):
+    """
+    jobs 為 {Future: (序號, 網址, 輸出設定)}，failures 為 [(序號, 網址, 錯誤訊息)]。
+    依完成順序把排版圖寫入 ZIP 並逐段輸出，最後附上 manifest.json 記錄每個項目的結果。
+    """
+    manifest = [{'index': index, 'url': url, 'error': error} for index, url, error in failures]
+    stream = _ZipStream()
+    # PNG、JPEG 與 WebP 都已經過壓縮，ZIP 內直接儲存即可
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for future in as_completed(jobs):
+            index, url, output = jobs[future]
             try:
-                alt_font = ImageFont.truetype(image_cfg['source_text_font_path'], image_cfg['source_text_font_size'])
-            except Exception:
-                alt_font = get_font(image_cfg['source_text_font_size'])
-            
-            bbox = alt_font.getbbox(source_text)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-            
-            alt_x = start_x + white_area_width - text_width - image_cfg['source_text_horizontal_margin']
-            alt_y = current_y + image_height - text_height - image_cfg['source_text_vertical_margin']
-            
-            # 繪製黑色描邊
-            stroke_width = image_cfg['source_text_stroke_width']
-            for x_offset in range(-stroke_width, stroke_width + 1):
-                for y_offset in range(-stroke_width, stroke_width + 1):
-                    if x_offset != 0 or y_offset != 0: 
-                        draw.text((alt_x + x_offset, alt_y + y_offset), source_text, font=alt_font, fill='black')
-            
-            # 繪製白色文字
-            draw.text((alt_x, alt_y), source_text, font=alt_font, fill='white')
-
-    # <<<< 原本的單張圖片邏輯 >>>>
-    else:
-        image_url = data.get('image_url', '')
-        if image_url and image_url != '未找到圖片':
-            # 修正：從快取中獲取圖片，避免重新下載
-            cached_images = url_cache.get(data.get('url'), {}).get('images', {})
-            downloaded_image = cached_images.get(image_url)
-            
-            if not downloaded_image:
-                downloaded_image = Scraper.download_image(image_url)
-                cached_images[image_url] = downloaded_image
-            
-            if downloaded_image: # 圖片已成功下載
-                target_width = white_area_width
-                target_height = image_height
-                
-                resized_image = downloaded_image.resize((target_width, target_height), Image.Resampling.LANCZOS)
-                
-                paste_x = start_x
-                paste_y = current_y
-                
-                background.paste(resized_image, (paste_x, paste_y))
-                
-                alt_text = data.get('alt_text', '')
-                # 只有當「顯示資料來源」被勾選，且有實際的 alt_text 時才繪製
-                if show_source and alt_text and alt_text != '未找到圖片或無替代文字':
-                    try:
-                        # 假設來源字體也放在 'static' 資料夾
-                        source_font_path = os.path.join(APP_ROOT, 'static', image_cfg['source_text_font_path'])
-                        alt_font = ImageFont.truetype(source_font_path, image_cfg['source_text_font_size'])
-                    except (OSError, IOError, ValueError) as e:
-                        print(f"警告：無法載入指定的來源字體 {source_font_path}，將使用預設字體。錯誤：{e}")
-                        alt_font = get_font(image_cfg['source_text_font_size']) # 使用預設的 get_font
-                    
-                    bbox = alt_font.getbbox(alt_text)
-                    text_width = bbox[2] - bbox[0]
-                    text_height = bbox[3] - bbox[1]
-                    
-                    alt_x = start_x + white_area_width - text_width - image_cfg['source_text_horizontal_margin']
-                    alt_y = current_y + image_height - text_height - image_cfg['source_text_vertical_margin']
-                    
-                    stroke_width = image_cfg['source_text_stroke_width']
-                    for x_offset in range(-stroke_width, stroke_width + 1):
-                        for y_offset in range(-stroke_width, stroke_width + 1):
-                            if x_offset != 0 or y_offset != 0: 
-                                draw.text((alt_x + x_offset, alt_y + y_offset), alt_text, font=alt_font, fill='black')
-
-                    draw.text((alt_x, alt_y), alt_text, font=alt_font, fill='white')
-            else: # 圖片下載失敗
-                error_font = get_font(32)
-                error_text = "圖片載入失敗"
-                bbox = error_font.getbbox(error_text)
-                text_width = bbox[2] - bbox[0]
-                text_x = start_x + (white_area_width - text_width) // 2
-                text_y = current_y + image_height // 2 - 20
-                draw.text((text_x, text_y), error_text, font=error_font, fill='white')
-        else: # 沒有圖片URL或圖片URL無效
-            no_image_font = get_font(32)
-            no_image_text = "無圖片內容"
-            bbox = no_image_font.getbbox(no_image_text)
-            text_width = bbox[2] - bbox[0]
-            text_x = start_x + (white_area_width - text_width) // 2
-            text_y = current_y + image_height // 2 - 20
-            draw.text((text_x, text_y), no_image_text, font=no_image_font, fill='white')
-    
-    return background
+                render_id, image_bytes, encode_seconds = future.result()
+            except Exception as e:
+                manifest.append({'index': index, 'url': url, 'error': f"繪製失敗: {e}"})
+                continue
+            if render_id is None:
+                manifest.append({'index': index, 'url': url, 'error': "圖片創建失敗，請檢查底圖或字體檔案。"})
+                continue
+            filename = f"{index:02d}.{output.extension}"
+            archive.writestr(filename, image_bytes)
+            manifest.append(dict({'index': index, 'url': url, 'file': filename, 'render_id': render_id},
+                                 **output_report(output, image_bytes, encode_seconds)))
+            yield stream.drain()
+        manifest.sort(key=lambda item: item['index'])
+        archive.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2))
+    yield stream.drain()
+
+# --- 執行期指標（/metrics） ---
+
+metrics_registry = Registry()
+request_latency = metrics_registry.histogram(
+    'ctinews_request_duration_seconds', '每個請求的處理時間（串流回應只計到開始輸出）', ('endpoint',))
+stage_latency = metrics_registry.histogram(
+    'ctinews_stage_duration_seconds', '抓取、解析、擷取、圖片下載、各繪製階段、編碼與頁面模板的耗時', ('stage', 'source'))
+requests_total = metrics_registry.counter('ctinews_requests_total', '依路由與狀態碼統計的請求數', ('endpoint', 'status'))
+errors_total = metrics_registry.counter('ctinews_errors_total', '依類型統計的處理失敗次數', ('kind',))
+
+def _cache_stats():
+    """各快取的統計，供指標輸出"""
+    caches = [('pages', page_cache.stats()), ('image_bytes', image_bytes_cache.stats()), ('images', image_cache.stats()),
+              ('renders', render_cache.stats()), ('fonts', font_registry.stats()), ('captions', caption_renderer.stats()),
+              ('layout_measures', layout_engine.measure_cache.stats()), ('layers', layout_engine.layer_cache.stats()),
+              ('layout_bases', layout_engine.base_cache.stats())]
+    if shared_cache:
+        caches.append(('shared', shared_cache.stats()))
+    return caches
+
+def _cache_hit_ratio(stats):
+    lookups = stats['hits'] + stats['misses']
+    return stats['hits'] / lookups if lookups else 0.0
+
+metrics_registry.collected_counter('ctinews_cache_hits_total', '快取命中次數', ('cache',),
+                                   lambda: [({'cache': name}, stats['hits']) for name, stats in _cache_stats()])
+metrics_registry.collected_counter('ctinews_cache_misses_total', '快取未命中次數', ('cache',),
+                                   lambda: [({'cache': name}, stats['misses']) for name, stats in _cache_stats()])
+metrics_registry.gauge('ctinews_cache_hit_ratio', '快取命中率（自行程啟動起計算）', ('cache',),
+                       lambda: [({'cache': name}, _cache_hit_ratio(stats)) for name, stats in _cache_stats()])
+metrics_registry.gauge('ctinews_cache_entries', '快取項目數', ('cache',),
+                       lambda: [({'cache': name}, stats['entries']) for name, stats in _cache_stats() if 'entries' in stats])
+metrics_registry.gauge('ctinews_cache_bytes', '快取用量（位元組）', ('cache',),
+                       lambda: [({'cache': name}, stats['bytes']) for name, stats in _cache_stats() if 'bytes' in stats])
+metrics_registry.collected_counter('ctinews_downloads_total', '圖片串流下載次數', ('status',),
+                                   lambda: [({'status': status}, get_http_client().stats()['downloads'][status])
+                                            for status in ('ok', 'aborted', 'errors')])
+metrics_registry.collected_counter('ctinews_download_bytes_total', '圖片下載的位元組數', (),
+                                   lambda: [({}, get_http_client().stats()['downloads']['bytes'])])
+metrics_registry.collected_counter('ctinews_download_seconds_total', '圖片下載花費的總時間', (),
+                                   lambda: [({}, get_http_client().stats()['downloads']['seconds'])])
+metrics_registry.collected_counter('ctinews_http_connections_total', '新建立的 HTTP 連線數', (),
+                                   lambda: [({}, get_http_client().stats()['connections'])])
+metrics_registry.collected_counter('ctinews_http_requests_total', '送出的 HTTP 請求數（含重複使用連線）', (),
+                                   lambda: [({}, get_http_client().stats()['requests'])])
+metrics_registry.collected_counter('ctinews_jobs_total', '背景排版工作數量', ('status',),
+                                   lambda: [({'status': 'submitted'}, job_queue.stats()['submitted']),
+                                            ({'status': 'failed'}, job_queue.stats()['failed']),
+                                            ({'status': 'rejected'}, job_queue.stats()['rejected'])])
+metrics_registry.gauge('ctinews_jobs_in_progress', '排隊中與執行中的背景排版工作', ('status',),
+                       lambda: [({'status': status}, job_queue.stats()[status]) for status in ('queued', 'running')])
+
+def observe_stages(timer, source):
+    """將計時器中的各階段耗時記入指標"""
+    for stage, seconds in timer.phases.items():
+        stage_latency.observe(seconds, stage=stage, source=source)
+
+# --- 請求剖析 ---
+
+request_profiler = RequestProfiler(PROFILE_CONFIG['directory'], sample_rate=PROFILE_CONFIG['sample_rate'],
+                                   interval=PROFILE_CONFIG['sample_interval'],
+                                   max_profiles=PROFILE_CONFIG['max_profiles'])
+
+def run_profiled(url, requested, func, *args):
+    """
+    要求剖析（requested 為 True 或 '1'）或被抽樣時，在剖析器中執行 func(*args, refresh=...)，
+    回傳 (func 的結果, profile_id)；未剖析或剖析結果寫入失敗時 profile_id 為 None。
+    明確要求剖析時 refresh 為 True，略過文章與排版圖快取，剖析結果才會包含實際的擷取與繪製；
+    抽樣剖析照常使用快取，反映實際流量的情形。
+    """
+    requested = requested in (True, 1, '1', 'on', 'true')
+    if not request_profiler.should_profile(requested):
+        return func(*args, refresh=False), None
+    with request_profiler.profile(url) as run:
+        result = func(*args, refresh=requested)
+    if run.profile_id:
+        print(f"剖析結果已儲存: {run.paths['meta']}")
+    return result, run.profile_id
 
 # --- Flask 應用程式設定 ---
 
 app = Flask(__name__)
 
+# 啟動時預先載入常用字體，讓第一個請求不需等待字體解析
+preload_layout_fonts()
+
 # --- 密碼與 Session 設定 ---
 # 為了讓 session 運作，需要設定一個 secret_key
 # 在生產環境中，建議使用更複雜且來自環境變數的密鑰
@@ -360,14 +595,12 @@ app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'a_default_secret_key_for_de
 # 從環境變數讀取密碼，如果沒有設定，則使用一個預設密碼
 APP_PASSWORD = os.environ.get('APP_PASSWORD', 'ctinews')
 
+# 自動化程式使用的 API 金鑰（Authorization: Bearer <金鑰>），未設定時只能以登入 session 使用 API
+API_TOKEN = os.environ.get('API_TOKEN', '')
+
 # 設定 session 的有效期限為 30 分鐘
 app.permanent_session_lifetime = timedelta(minutes=30)
 
-
-# --- 簡單的記憶體快取機制 ---
-url_cache = {}
-CACHE_TTL = 600  # 快取存活時間（秒），這裡設定為 10 分鐘
-
 # --- 登入裝飾器 ---
 def login_required(f):
     @wraps(f)
@@ -377,10 +610,64 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def _has_valid_token():
+    """檢查請求是否帶有正確的 API 金鑰"""
+    if not API_TOKEN:
+        return False
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(token.strip().encode('utf-8'), API_TOKEN.encode('utf-8'))
+
+def api_auth_required(f):
+    """API 路由用：接受 API 金鑰或已登入的 session，驗證失敗時回傳 401 JSON 而不是重導向登入頁"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'logged_in' not in session and not _has_valid_token():
+            return jsonify({'error': "需要登入或有效的 API 金鑰。"}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+@app.before_request
+def start_request_timer():
+    """每個請求一個計時器，熱點程式碼以 current_timer() 記錄各階段耗時"""
+    g.request_start = time.perf_counter()
+    g.timer = PhaseTimer()
+    g.timer_token = set_timer(g.timer)
+
+@app.after_request
+def record_request_timing(response):
+    """加上 Server-Timing 標頭並更新請求指標"""
+    timer = g.get('timer')
+    if timer is None:
+        return response
+    total = time.perf_counter() - g.request_start
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timer.phases.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    response.headers['Server-Timing'] = ', '.join(entries)
+    if 'profile_id' in g:
+        response.headers['X-Profile-Id'] = g.profile_id
+    endpoint = request.endpoint or 'unmatched'
+    request_latency.observe(total, endpoint=endpoint)
+    requests_total.inc(endpoint=endpoint, status=response.status_code)
+    observe_stages(timer, 'request')
+    return response
+
+@app.teardown_request
+def stop_request_timer(exc):
+    token = g.pop('timer_token', None)
+    if token is not None:
+        try:
+            reset_timer(token)
+        except ValueError:
+            # 串流回應在另一個 context 中結束時無法還原，下一個請求會重新設定
+            pass
+
 @app.before_request
 def make_session_permanent():
     # 在每個請求前，將 session 設為永久性，這樣才會套用 lifetime 設定
     # 並且每次使用者有操作時，session 的到期時間會被自動刷新
+    # 以 API 金鑰呼叫的請求不使用 session，也不需要回傳 Cookie
+    if _has_valid_token():
+        return
     session.permanent = True
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -422,6 +709,14 @@ def generate_image():
     # 使用者的登入狀態也已經被安全地保存到瀏覽器中。
     session.modified = True
 
+    # 要求剖析（表單或查詢參數 profile=1）或被抽樣時，整個處理流程在剖析器中執行
+    page, profile_id = run_profiled(url, request.values.get('profile'), _generate_image_page, url)
+    if profile_id:
+        g.profile_id = profile_id
+    return page
+
+def _generate_image_page(url, refresh=False):
+    """/generate_image 的主要流程：取得文章、繪製排版圖並回傳結果頁面"""
     try:
         # 檢查新功能選項
         is_dual_image = request.form.get('dual_image') == 'on'
@@ -431,104 +726,267 @@ def generate_image():
         edited_title = request.form.get('edited_title')
         edited_content = request.form.get('edited_content')
         edited_alt_text = request.form.get('edited_alt_text')
+        try:
+            output = OutputFormat.from_options(output_options_from_form(request.form))
+        except ValueError as e:
+            return render_template('index.html', error=str(e))
 
-        # --- 最終、最穩定的快取與 Session 邏輯 ---
-        current_time = time.time()
-        cached_entry = url_cache.get(url)
+        # --- 快取與 Session 邏輯 ---
+        # 快取命中時會自動延長快取壽命；過期或超過額度的項目由 LRUCache 淘汰
+        # 快取的是擷取完成的精簡紀錄，命中時不需要任何 HTML 解析
+        record = get_article_record(url, refresh=refresh)
 
-        # 檢查快取是否存在且未過期
-        if cached_entry and (current_time - cached_entry['timestamp'] < CACHE_TTL):
-            print(f"CACHE HIT for URL: {url}")
-            scraper = Scraper(url, soup=cached_entry['soup'])
-            # 更新時間戳，延長快取壽命
-            cached_entry['timestamp'] = current_time
-        else:
-            # 快取未命中或已過期，執行實際抓取
-            print(f"CACHE MISS for URL: {url}")
-            
-            scraper = Scraper(url)
-            # 將新的爬取結果存入快取
-            url_cache[url] = {
-                'soup': scraper.soup, 
-                'timestamp': current_time,
-                'images': {} # 為這個 URL 初始化一個圖片快取字典
-            }
-
-        dual_image_data = None
-        layout_image = None
-
-        # --- 核心邏輯切換 ---
-        if is_dual_image:
-            # 雙框圖片模式
-            try:
-                img1_idx = int(request.form.get('image_index_1', 1))
-                img2_idx = int(request.form.get('image_index_2', 2))
-            except (ValueError, TypeError):
-                return render_template('index.html', error="圖片索引必須是數字。")
-
-            all_images = scraper.get_all_content_images()
-            if len(all_images) < max(img1_idx, img2_idx):
-                return render_template('index.html', error=f"文章圖片數量不足 (共 {len(all_images)} 張)，無法選取第 {max(img1_idx, img2_idx)} 張圖。")
-
-            # 準備傳給繪圖函式的資料
-            title = edited_title if edited_title is not None else scraper.extract_title()
-            content = edited_content if edited_content is not None else scraper.extract_first_content()
-            dual_image_data = {
-                'title': title, # 直接使用從 soup 提取的資料
-                'content': content,
-                'img1_url': all_images[img1_idx - 1]['image_url'],
-                'alt_text': edited_alt_text if edited_alt_text is not None else all_images[img1_idx - 1]['alt_text'],
-                'img2_url': all_images[img2_idx - 1]['image_url'],
-                'img1_idx': img1_idx,
-                'img2_idx': img2_idx,
-                'url': url # 將當前 url 傳遞給繪圖函式以利快取
-            }
-            # 將 dual_image_data 同時指派給 result，以供後續程式碼使用
-            result = dual_image_data
-            layout_image = create_layout_image(dual_image_data, show_source=show_source, dual_image_data=dual_image_data)
+        # --- 核心邏輯切換：雙框圖片模式或原本的單張圖片模式 ---
+        try:
+            result, dual_image_data = build_layout_data(
+                record, url, dual_image=is_dual_image,
+                image_index_1=request.form.get('image_index_1', 1),
+                image_index_2=request.form.get('image_index_2', 2),
+                edited_title=edited_title, edited_content=edited_content, edited_alt_text=edited_alt_text)
+        except ValueError as e:
+            return render_template('index.html', error=str(e))
+        render_id, image_bytes, encode_seconds = render_layout(result, show_source=show_source,
+                                                              dual_image_data=dual_image_data, output=output,
+                                                              refresh=refresh)
 
-        else:
-            # 原本的單張圖片模式
-            if edited_title is not None or edited_content is not None or edited_alt_text is not None:
-                # 如果是重新生成，使用編輯過的文字
-                original_data = scraper.get_content() # 仍然需要圖片URL
-                result = {
-                    'title': edited_title if edited_title is not None else original_data['title'],
-                    'content': edited_content if edited_content is not None else original_data['content'],
-                    'image_url': original_data['image_url'],
-                    'alt_text': edited_alt_text if edited_alt_text is not None else original_data['alt_text'],
-                    'url': url # 將當前 url 傳遞給繪圖函式以利快取
-                }
-            else:
-                # 第一次生成
-                result = scraper.get_content()
-            layout_image = create_layout_image(result, show_source=show_source)
+        # 本次需要的圖片已處理完畢，接著在背景預取文章中的其他圖片
+        prefetch_article_images(record)
 
         if 'error' in result:
             return render_template('index.html', error=result['error'])
 
-        if layout_image is None:
+        if render_id is None:
             return render_template('index.html', error="圖片創建失敗，請檢查底圖或字體檔案。")
 
-        # 將最終圖片轉換為 base64
-        img_byte_arr = io.BytesIO()
-        layout_image.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
-        image_data_uri = "data:image/png;base64," + base64.b64encode(img_byte_arr.read()).decode('ascii')
-
-        return render_template(
+        # 頁面只引用圖片網址，圖片本身由 /rendered 路由另外提供
+        timer = current_timer()
+        timer.restart()
+        page = render_template(
             'index.html',
-            image_data_uri=image_data_uri,
+            image_url=rendered_image_url(render_id, output),
             title=result['title'],
             content_snippet=result['content'],
-            alt_text=result['alt_text']
+            alt_text=result['alt_text'],
+            output_info=output_report(output, image_bytes, encode_seconds),
+            output_extension=output.extension,
+            # 背景工作剖析過時，表單會帶回該工作的剖析結果編號
+            profile_id=request.form.get('profile_id')
         )
+        timer.mark('template')
+        return page
         
     except Exception as e:
         import traceback
         traceback.print_exc()
+        errors_total.inc(kind='generate_image')
         return render_template('index.html', error=f"處理失敗: {str(e)}")
 
+@app.route('/rendered/<render_id>.<any(png, jpg, webp):ext>')
+@api_auth_required
+def rendered_image(render_id, ext):
+    """提供已生成的排版圖，支援 ETag 條件式請求；MIME 類型依實際內容判斷，副檔名只用於下載時的檔名"""
+    image_bytes = get_rendered_image(render_id)
+    if image_bytes is None:
+        abort(404)
+    # 同一個 render_id 的內容永遠相同，可讓瀏覽器長時間快取
+    response = send_file(io.BytesIO(image_bytes), mimetype=sniff_mimetype(image_bytes), etag=render_id,
+                         conditional=True, max_age=CACHE_TTL, last_modified=None)
+    response.cache_control.private = True
+    response.cache_control.public = False
+    return response
+
+@app.route('/batch_render', methods=['POST'])
+@api_auth_required
+def batch_render():
+    """
+    批次繪製多篇文章，回傳逐張寫入的 ZIP。請求內容為 JSON：
+    {"items": [{"url": ..., "show_source": true, "dual_image": false, "image_index_1": 1, "image_index_2": 2,
+                "edited_title": ..., "edited_content": ..., "edited_alt_text": ..., "output": {...}}, ...]}
+    output 與 /api/render 相同，可逐項指定。
+    文章以非同步方式並行抓取，排版圖在行程池中並行繪製；失敗的項目記錄在 ZIP 內的 manifest.json。
+    """
+    payload = request.get_json(silent=True) or {}
+    items = payload.get('items')
+    if not isinstance(items, list) or not items or not all(
+            isinstance(item, dict) and isinstance(item.get('url'), str) and item['url'].strip() for item in items):
+        return jsonify({'error': "請提供 items 列表，每個項目都需要字串 url。"}), 400
+    if len(items) > BATCH_CONFIG['max_items']:
+        return jsonify({'error': f"一次最多 {BATCH_CONFIG['max_items']} 個項目。"}), 400
+
+    # 並行抓取所有未快取的文章
+    batch = BatchScraper(fetch_images=False, load_record=lookup_article_record)
+    records, fetch_errors = {}, {}
+    for fetched in batch.scrape_all(item['url'] for item in items):
+        if fetched.ok:
+            records[fetched.url] = fetched.record
+            remember_article_record(fetched.url, fetched.record)
+        else:
+            fetch_errors[fetched.url] = f"處理失敗: {fetched.error}"
+
+    # 準備每個項目的繪圖資料
+    layouts, failures = [], []
+    for index, item in enumerate(items, 1):
+        url = Scraper._validate_url(item['url'].strip())
+        if url not in records:
+            failures.append((index, item['url'], fetch_errors.get(url, "處理失敗")))
+            continue
+        try:
+            data, dual_image_data = build_layout_data(
+                records[url], url, dual_image=bool(item.get('dual_image')),
+                image_index_1=item.get('image_index_1', 1), image_index_2=item.get('image_index_2', 2),
+                edited_title=item.get('edited_title'), edited_content=item.get('edited_content'),
+                edited_alt_text=item.get('edited_alt_text'))
+            output = OutputFormat.from_options(item.get('output'))
+        except ValueError as e:
+            failures.append((index, item['url'], str(e)))
+            continue
+        layouts.append((index, item['url'], data, bool(item.get('show_source')), dual_image_data, output))
+
+    # 有共用磁碟快取時，先在本行程並行下載所有圖片，子行程只需讀取快取並繪製
+    if shared_cache:
+        image_fetcher.fetch_many([url for _, _, data, _, dual_image_data, _ in layouts
+                                  for url in _layout_image_urls(data, dual_image_data)])
+
+    jobs = {render_pool.submit(render_layout_job, data, show_source, dual_image_data, output): (index, url, output)
+            for index, url, data, show_source, dual_image_data, output in layouts}
+    response = Response(stream_with_context(stream_layout_zip(jobs, failures)), mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename=layouts.zip'
+    return response
+
+@app.route('/api/render', methods=['POST'])
+@api_auth_required
+def api_render():
+    """
+    以 JSON 呼叫的單篇排版 API，輸入與表單相同：
+    {"url": ..., "show_source": true, "dual_image": false, "image_index_1": 1, "image_index_2": 2,
+     "edited_title": ..., "edited_content": ..., "edited_alt_text": ..., "format": "image" | "json",
+     "output": {"format": "png" | "jpeg" | "webp", "quality": 90, "compress_level": 6, "subsampling": "4:2:0",
+                "preview": false}}
+    format 為 "image"（預設，舊名稱 "png" 仍可使用）時直接回傳圖片，擷取資訊放在 X-Article-* 標頭
+    （UTF-8 百分比編碼），檔案大小與編碼時間放在 X-Output-Size、X-Encode-Seconds 標頭（沒有編碼時間的紀錄時沒有後者）；
+    為 "json" 時回傳擷取資訊、輸出資訊與 /rendered 的圖片網址。output 省略的欄位使用 OUTPUT_CONFIG 的預設值。
+    加上 "profile": true 時略過快取並剖析這次請求，剖析結果編號放在 X-Profile-Id 標頭。
+    """
+    options = request.get_json(silent=True)
+    if not isinstance(options, dict) or not options.get('url'):
+        return jsonify({'error': "請以 JSON 提供 url。"}), 400
+    response, profile_id = run_profiled(options['url'], options.get('profile'), _api_render, options)
+    if profile_id:
+        g.profile_id = profile_id
+    return response
+
+def _api_render(options, refresh=False):
+    url = options['url']
+    try:
+        record = get_article_record(url, refresh=refresh)
+    except Exception as e:
+        errors_total.inc(kind='scrape')
+        return jsonify({'error': f"處理失敗: {e}"}), 502
+
+    try:
+        result, dual_image_data = build_layout_data(
+            record, url, dual_image=bool(options.get('dual_image')),
+            image_index_1=options.get('image_index_1', 1), image_index_2=options.get('image_index_2', 2),
+            edited_title=options.get('edited_title'), edited_content=options.get('edited_content'),
+            edited_alt_text=options.get('edited_alt_text'))
+        output = OutputFormat.from_options(options.get('output'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    render_id, image_bytes, encode_seconds = render_layout(result, show_source=bool(options.get('show_source')),
+                                                          dual_image_data=dual_image_data, output=output,
+                                                          refresh=refresh)
+    prefetch_article_images(record)
+    if render_id is None:
+        errors_total.inc(kind='render')
+        return jsonify({'error': "圖片創建失敗，請檢查底圖或字體檔案。"}), 500
+
+    report = output_report(output, image_bytes, encode_seconds)
+    if options.get('format') == 'json':
+        return jsonify(dict({
+            'render_id': render_id,
+            'image_url': rendered_image_url(render_id, output, _external=True),
+            'title': result['title'],
+            'content': result['content'],
+            'alt_text': result['alt_text'],
+            'source_image_urls': _layout_image_urls(result, dual_image_data),
+            'content_images': record.content_images(),
+        }, **report))
+
+    response = send_file(io.BytesIO(image_bytes), mimetype=output.mimetype, etag=render_id,
+                         conditional=True, max_age=CACHE_TTL, last_modified=None)
+    response.cache_control.private = True
+    response.cache_control.public = False
+    response.headers['X-Render-Id'] = render_id
+    response.headers['X-Output-Size'] = str(report['size'])
+    if report['encode_seconds'] is not None:
+        response.headers['X-Encode-Seconds'] = str(report['encode_seconds'])
+    # HTTP 標頭只能是 ASCII，中文內容以 UTF-8 百分比編碼
+    response.headers['X-Article-Title'] = quote(result['title'])
+    response.headers['X-Article-Alt-Text'] = quote(result['alt_text'])
+    response.headers['X-Article-Image-Urls'] = ' '.join(quote(image_url, safe=':/?&=%#')
+                                                        for image_url in _layout_image_urls(result, dual_image_data))
+    return response
+
+@app.route('/jobs', methods=['POST'])
+@api_auth_required
+def submit_job():
+    """
+    建立背景排版工作並立即回傳工作編號（202）。輸入可以是 /api/render 的 JSON，
+    或與 /generate_image 相同的表單欄位；之後以 GET /jobs/<job_id> 查詢進度。
+    要求剖析（JSON 的 "profile": true 或表單的 profile=1）時，完成的工作結果中附有 profile_id。
+    排隊中與執行中的工作已達 JOB_CONFIG['max_pending'] 時回傳 429。
+    """
+    options = request.get_json(silent=True) if request.is_json else render_options_from_form(request.form)
+    if not isinstance(options, dict) or not options.get('url'):
+        return jsonify({'error': "請輸入有效的網址。"}), 400
+    try:
+        job_id = job_queue.submit(options)
+    except QueueFull as e:
+        return jsonify({'error': str(e)}), 429
+    return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
+
+@app.route('/jobs/<job_id>')
+@api_auth_required
+def job_status(job_id):
+    """查詢工作進度：status 為 queued / running / done / failed，stage 為目前所在的階段"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': "找不到這個工作，可能已過期。"}), 404
+    if job['status'] == 'done':
+        job['image_url'] = url_for('rendered_image', render_id=job['result']['render_id'],
+                                   ext=FORMATS[job['result']['output']['format']][1])
+    return jsonify(job)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus 文字格式的指標；需要登入或 API 金鑰（設定 allow_loopback 後本機來源可直接讀取）"""
+    local = METRICS_CONFIG['allow_loopback'] and request.remote_addr in ('127.0.0.1', '::1')
+    if not local and 'logged_in' not in session and not _has_valid_token():
+        return jsonify({'error': "需要登入或有效的 API 金鑰。"}), 401
+    return Response(metrics_registry.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/cache_stats')
+@login_required
+def cache_stats():
+    """回傳各快取的命中率與用量，供監控使用"""
+    return jsonify({
+        'pages': page_cache.stats(),
+        'image_bytes': image_bytes_cache.stats(),
+        'images': image_cache.stats(),
+        'renders': render_cache.stats(),
+        'fonts': font_registry.stats(),
+        'captions': caption_renderer.stats(),
+        'layout_measures': layout_engine.measure_cache.stats(),
+        'layers': layout_engine.layer_cache.stats(),
+        'layout_bases': layout_engine.base_cache.stats(),
+        'shared': shared_cache.stats() if shared_cache else None,
+        'http': get_http_client().stats(),
+        'render_pool': render_pool.stats(),
+        'jobs': job_queue.stats(),
+        'profiles': request_profiler.stats(),
+    })
+
 @app.route('/debug_html', methods=['POST'])
 @login_required
 def debug_html():
@@ -538,7 +996,8 @@ def debug_html():
         return "請提供 URL"
     
     try:
-        scraper = Scraper(url) # 現在 url 變數已定義
+        # 診斷需要完整的原始碼（包含 <script> 中的圖片網址），因此不使用精簡解析
+        scraper = Scraper(url, restricted=False)
         debug_info = []
         debug_info.append("=== HTML 結構診斷 ===\n")
         
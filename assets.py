@@ -0,0 +1,108 @@
+"""
+繪圖素材快取模組。
+背景底圖只在每個 worker 中解碼並縮放一次，之後每次繪圖只需複製一份；
+資料來源文字則預先繪製成帶描邊的透明圖塊，重複的文字只需貼上一次。
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw
+
+
+class BackgroundTemplate:
+    """
+    保存已解碼、已調整為版面尺寸的背景底圖。
+    底圖檔案 (mtime/大小) 或版面設定 (路徑/寬/高) 變更時會自動重新載入。
+    """
+    def __init__(self, static_dir):
+        self.static_dir = static_dir
+        self._key = None
+        self._image = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _current_key(self, layout_cfg):
+        path = os.path.join(self.static_dir, layout_cfg['background_path'])
+        stat = os.stat(path)  # 檔案不存在時拋出 FileNotFoundError
+        return (path, layout_cfg['width'], layout_cfg['height'], stat.st_mtime_ns, stat.st_size)
+
+    def _load(self, key):
+        path, width, height = key[:3]
+        with Image.open(path) as image:
+            image.load()
+            if image.size != (width, height):
+                image = image.resize((width, height), Image.Resampling.LANCZOS)
+            else:
+                image = image.copy()
+        image.readonly = 1  # 範本本身不允許被繪製，每次使用都必須複製
+        return image
+
+    def get(self, layout_cfg):
+        """回傳一份可自由繪製的背景底圖副本"""
+        key = self._current_key(layout_cfg)
+        with self._lock:
+            if key != self._key:
+                self._image = self._load(key)
+                self._key = key
+                self.loads += 1
+            template = self._image
+        return template.copy()
+
+
+class CaptionRenderer:
+    """
+    以 Pillow 原生的 stroke 參數一次繪製帶黑色描邊的白字，
+    並以 (文字, 字體, 大小, 描邊寬度, 顏色) 為鍵快取繪製好的 RGBA 圖塊。
+    """
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._sprites = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _render(text, font, stroke_width, fill, stroke_fill):
+        left, top, right, bottom = font.getbbox(text, stroke_width=stroke_width)
+        sprite = Image.new('RGBA', (max(right - left, 1), max(bottom - top, 1)), (0, 0, 0, 0))
+        ImageDraw.Draw(sprite).text((-left, -top), text, font=font, fill=fill,
+                                    stroke_width=stroke_width, stroke_fill=stroke_fill)
+        return sprite, (left, top)
+
+    def get(self, text, font, stroke_width, fill='white', stroke_fill='black'):
+        """回傳 (圖塊, 相對於文字原點的位移)"""
+        font_path = getattr(font, 'path', None)
+        if not isinstance(font_path, str):
+            # Pillow 內建字體沒有檔案路徑可作為快取鍵，直接繪製
+            return self._render(text, font, stroke_width, fill, stroke_fill)
+
+        key = (text, font_path, getattr(font, 'index', 0), font.size, stroke_width, fill, stroke_fill)
+        with self._lock:
+            cached = self._sprites.get(key)
+            if cached is not None:
+                self.hits += 1
+                self._sprites.move_to_end(key)
+                return cached
+            self.misses += 1
+
+        cached = self._render(text, font, stroke_width, fill, stroke_fill)
+        with self._lock:
+            self._sprites[key] = cached
+            while len(self._sprites) > self.max_entries:
+                self._sprites.popitem(last=False)
+        return cached
+
+    def paste(self, image, xy, text, font, stroke_width, fill='white', stroke_fill='black'):
+        """在 image 的 xy（與 draw.text 相同的文字原點）貼上描邊文字"""
+        sprite, (offset_x, offset_y) = self.get(text, font, stroke_width, fill, stroke_fill)
+        image.paste(sprite, (int(xy[0]) + offset_x, int(xy[1]) + offset_y), sprite)
+
+    def clear(self):
+        with self._lock:
+            self._sprites.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._sprites),
+                    'max_entries': self.max_entries}
@@ -0,0 +1,151 @@
+"""
+多篇文章的非同步批次擷取。
+以 asyncio 排程所有網址：網頁與主圖的下載在執行緒池中透過共用的 HttpClient 進行
+（沿用連線池、重試、逾時與圖片下載上限），每個主機各自限制同時進行的請求數。
+解析與擷取使用與 Scraper 相同的邏輯，哪一篇先完成就先回傳。
+
+用法：
+    python batch.py URL [URL ...]
+    python batch.py --file urls.txt
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from scraper import Scraper
+from layout import NO_IMAGE
+from config import SCRAPER_CONFIG
+
+
+class BatchResult:
+    """
+    單一網址的擷取結果。成功時 record 為 ArticleRecord，image 為主圖原始位元組
+    （沒有主圖、未下載主圖或下載失敗時為 None）；失敗時 error 為例外物件。
+    """
+    __slots__ = ('url', 'record', 'image', 'error', 'seconds')
+
+    def __init__(self, url, record=None, image=None, error=None, seconds=0.0):
+        self.url = url
+        self.record = record
+        self.image = image
+        self.error = error
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def to_dict(self):
+        """轉為可輸出成 JSON 的 dict（不含圖片內容）"""
+        data = {'url': self.url, 'ok': self.ok, 'seconds': round(self.seconds, 3)}
+        if self.record is not None:
+            data['record'] = self.record.to_dict()
+            data['image_bytes'] = len(self.image) if self.image is not None else None
+        if self.error is not None:
+            data['error'] = f"{type(self.error).__name__}: {self.error}"
+        return data
+
+
+class BatchScraper:
+    """
+    fetch_page(url) 回傳網頁 HTML，fetch_image(url) 回傳圖片位元組或 None，兩者都在執行緒池中呼叫；
+    預設為 Scraper.fetch_html 與 Scraper.download_image_bytes，可換成經過快取的版本。
+    load_record(url) 若有提供，會在下載網頁前先呼叫，回傳 ArticleRecord 時直接使用（例如已在快取中）。
+    """
+    def __init__(self, per_host_limit=None, max_workers=None, fetch_images=True,
+                 fetch_page=None, fetch_image=None, load_record=None, parser=None, restricted=None):
+        self.per_host_limit = per_host_limit or SCRAPER_CONFIG['batch_per_host_limit']
+        self.max_workers = max_workers or SCRAPER_CONFIG['batch_workers']
+        self.fetch_images = fetch_images
+        self.fetch_page = fetch_page or Scraper.fetch_html
+        self.fetch_image = fetch_image or Scraper.download_image_bytes
+        self.load_record = load_record
+        self.parser = parser or Scraper.default_parser()
+        self.restricted = SCRAPER_CONFIG['restricted_parse'] if restricted is None else restricted
+
+    async def scrape(self, urls):
+        """非同步產生器：依完成順序 yield 每個網址的 BatchResult（重複的網址只處理一次）"""
+        loop = asyncio.get_running_loop()
+        host_limits = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='batch-scrape') as executor:
+            tasks = [asyncio.ensure_future(self._scrape_one(url, loop, executor, host_limits))
+                     for url in dict.fromkeys(Scraper._validate_url(url.strip()) for url in urls if url.strip())]
+            try:
+                for task in asyncio.as_completed(tasks):
+                    yield await task
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    async def _scrape_one(self, url, loop, executor, host_limits):
+        start = time.perf_counter()
+        try:
+            record = None
+            if self.load_record is not None:
+                record = await loop.run_in_executor(executor, self.load_record, url)
+            if record is None:
+                async with self._host_limit(url, host_limits):
+                    html = await loop.run_in_executor(executor, self.fetch_page, url)
+                record = await loop.run_in_executor(executor, self._extract, url, html)
+            image = None
+            if self.fetch_images and record.image_url and record.image_url != NO_IMAGE:
+                async with self._host_limit(record.image_url, host_limits):
+                    image = await loop.run_in_executor(executor, self.fetch_image, record.image_url)
+            return BatchResult(url, record, image, seconds=time.perf_counter() - start)
+        except Exception as e:
+            return BatchResult(url, error=e, seconds=time.perf_counter() - start)
+
+    def _host_limit(self, url, host_limits):
+        """取得該主機的 Semaphore（在事件迴圈中建立，每次 scrape 各自一組）"""
+        host = urlparse(url).netloc
+        if host not in host_limits:
+            host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return host_limits[host]
+
+    def _extract(self, url, html):
+        """與 Scraper(url).extract_record() 相同的解析與擷取"""
+        return Scraper.from_html(url, html, self.parser, self.restricted).extract_record()
+
+    def scrape_all(self, urls):
+        """同步版本：在新的事件迴圈中執行 scrape，回傳依完成順序排列的 BatchResult 列表"""
+        async def collect():
+            return [result async for result in self.scrape(urls)]
+        return asyncio.run(collect())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('urls', nargs='*')
+    parser.add_argument('--file', help='每行一個網址的文字檔')
+    parser.add_argument('--per-host', type=int, default=None, help='每個主機同時進行的請求數')
+    parser.add_argument('--no-images', action='store_true', help='不下載主圖')
+    args = parser.parse_args()
+
+    urls = list(args.urls)
+    if args.file:
+        with open(args.file, encoding='utf-8') as f:
+            urls += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    if not urls:
+        parser.error('請提供至少一個網址')
+
+    async def run():
+        batch = BatchScraper(per_host_limit=args.per_host, fetch_images=not args.no_images)
+        done = failed = 0
+        async for result in batch.scrape(urls):
+            done += 1
+            failed += not result.ok
+            print(json.dumps(result.to_dict(), ensure_ascii=False), flush=True)
+        return done, failed
+
+    start = time.perf_counter()
+    done, failed = asyncio.run(run())
+    print(f"完成 {done} 個網址，失敗 {failed} 個，共 {time.perf_counter() - start:.2f} 秒", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+比較圖片判斷規則的舊版（逐一 re.search）與預先編譯版本的速度，並確認判斷結果完全一致。
+測試資料為語料頁面中所有 <img> 標籤，加上常見網址與替代文字的組合。
+
+用法：
+    python benchmarks/bench_classifier.py [--corpus benchmarks/corpus] [--repeat 5]
+"""
+import argparse
+import glob
+import itertools
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scraper import Scraper  # noqa: E402
+
+BASE_URL = 'https://ctinews.com/news/items/benchmark'
+
+
+# --- 舊版實作（僅供比對） ---
+
+def is_content_image_reference(src, alt):
+    exclude_patterns = [
+        r'logo', r'icon', r'avatar', r'ad[^a-z]', r'banner', r'button', r'arrow',
+        r'bg[^a-z]', r'background', r'_80x80', r'thumb', r'small', r'mini',
+        r'facebook', r'twitter', r'instagram', r'youtube', r'share', r'social'
+    ]
+    src_lower, alt_lower = src.lower(), alt.lower()
+    if any(re.search(p, src_lower) or re.search(p, alt_lower) for p in exclude_patterns):
+        return False
+    content_indicators = ['資料照', '圖片來源', '截自', '翻攝', '中天新聞', '記者', '攝影', '.jpg', '.png', '.jpeg', '.webp']
+    if any(indicator in alt or indicator.lower() in src_lower for indicator in content_indicators):
+        return True
+    if alt and 10 <= len(alt) <= 200: return True
+    if 'storage.ctinews.com' in src: return True
+    return False
+
+
+def main_score_reference(img, src, alt, position):
+    score = 0
+    if position <= 5: score += [50, 30, 20, 10, 10, 10][position]
+    else: score -= position * 2
+    if alt:
+        if '資料照' in alt or '中天新聞' in alt: score += 40
+        if re.search(r'[\u4e00-\u9fff]{2,4}', alt): score += 20
+        if 15 <= len(alt) <= 100: score += 15
+        elif len(alt) > 100: score += 5
+        if len(alt) > 50 and any(k in alt for k in ['圖', '攝', '翻攝', '資料照']): score += 25
+    if 'storage.ctinews.com' in src:
+        score += 30
+        if '/compression/files/' in src: score += 20
+        if 'cut-' in src: score += 15
+    loading = img.get('loading', '')
+    if loading == 'eager': score += 25
+    elif loading == 'lazy': score += 10
+    width, height = img.get('width'), img.get('height')
+    if width and height:
+        try:
+            w, h = int(width), int(height)
+            if w > h and w >= 300: score += 25
+            elif w >= 200 and h >= 200: score += 15
+        except ValueError: pass
+    if any(k.lower() in src.lower() or k.lower() in alt.lower() for k in ['logo', 'icon', 'avatar', 'ad', 'banner', 'thumb']):
+        score -= 30
+    return score
+
+
+def relevance_score_reference(img, src, alt, position):
+    score = 10
+    score += max(0, 40 - position * 5)
+    if alt:
+        if '資料照／中天新聞' in alt: score += 60
+        elif '資料照' in alt: score += 40
+        elif '中天新聞' in alt: score += 30
+        if any(k in alt for k in ['圖片來源', '截自', '翻攝', '記者', '圖／']): score += 20
+        if re.search(r'[\u4e00-\u9fff]{2,}', alt): score += 15
+        if len(alt) > 50: score += 10
+    if 'storage.ctinews.com' in src:
+        score += 35
+        if '/compression/files/' in src: score += 15
+    if src.lower().endswith(('.jpg', '.jpeg', '.png')): score += 10
+    elif src.lower().endswith('.webp'): score += 5
+    loading = img.get('loading', '')
+    if loading == 'eager': score += 20
+    elif loading == 'lazy': score += 10
+    if any(p.lower() in src.lower() or p.lower() in alt.lower() for p in ['logo', 'icon', 'avatar', 'ad', 'banner', 'thumb', 'small']):
+        score -= 40
+    return score
+
+
+def extract_text_in_parentheses_reference(text):
+    if not text or text == '無替代文字': return text
+    patterns = [r'（([^）]+)）', r'\(([^)]+)\)', r'【([^】]+)】', r'\[([^\]]+)\]']
+    for pattern in patterns:
+        matches = re.findall(pattern, text)
+        if matches: return max(matches, key=len)
+    return text[:100] + "..." if len(text) > 100 else text
+
+
+# --- 測試資料 ---
+
+SRCS = [
+    'https://storage.ctinews.com/compression/files/default/cut-abc123.jpg',
+    'https://storage.ctinews.com/compression/files/default/thumb-1_80x80.jpg',
+    'https://ctinews.com/images/logo.png', 'https://ctinews.com/static/ICON-share.svg',
+    'https://cdn.example.com/ad_300x250.gif', 'https://cdn.example.com/Banner/top.webp',
+    'https://ctinews.com/uploads/2025/photo.JPEG', 'https://ctinews.com/uploads/bg_header.png',
+    'https://ctinews.com/uploads/avatar/u1.png', 'https://ctinews.com/media/plain',
+]
+ALTS = [
+    '', '中天新聞網 logo', '立委在議場內發言。（圖／資料照／中天新聞）', '颱風路徑圖',
+    'facebook', '記者會現場（圖／記者李小華攝）', 'Photo by AP (Reuters)', '相關新聞縮圖',
+    '行政院長受訪畫面【圖片來源：行政院】', 'x' * 150, '翻攝畫面', 'Social Share Button',
+]
+
+
+def build_samples(corpus):
+    """回傳 [(img, src, alt, position)]"""
+    samples = []
+    for path in sorted(glob.glob(os.path.join(corpus, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            soup = Scraper.parse_html(f.read(), 'html.parser')
+        scraper = Scraper(BASE_URL, soup=soup)
+        for position, img in enumerate(soup.find_all('img')):
+            src = scraper._get_image_src(img) or ''
+            samples.append((img, src, scraper._get_image_alt_text(img), position))
+    template = Scraper.parse_html('<img loading="eager" width="1200" height="675">', 'html.parser').img
+    for position, (src, alt) in enumerate(itertools.product(SRCS, ALTS)):
+        samples.append((template, src, alt, position % 12))
+    return samples
+
+
+def run_reference(samples):
+    return [(is_content_image_reference(src, alt), main_score_reference(img, src, alt, position),
+             relevance_score_reference(img, src, alt, position), extract_text_in_parentheses_reference(alt))
+            for img, src, alt, position in samples]
+
+
+def run_compiled(samples):
+    scraper = Scraper(BASE_URL, soup=Scraper.parse_html('', 'html.parser'))
+    return [(Scraper._is_content_image(src, alt), scraper._calculate_main_image_score(img, src, alt, position),
+             scraper._calculate_improved_relevance_score(img, src, alt, position), Scraper._extract_text_in_parentheses(alt))
+            for img, src, alt, position in samples]
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpus', default=os.path.join(ROOT, 'benchmarks', 'corpus'))
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    samples = build_samples(args.corpus)
+    old_time, old_results = best_of(lambda: run_reference(samples), args.repeat)
+    new_time, new_results = best_of(lambda: run_compiled(samples), args.repeat)
+    mismatches = sum(1 for a, b in zip(old_results, new_results) if a != b)
+
+    print(f"圖片樣本 {len(samples)} 個")
+    print(f"舊版：{old_time * 1000:.2f} ms  預先編譯：{new_time * 1000:.2f} ms  加速 {old_time / new_time:.1f}x")
+    print(f"判斷結果{'全部一致' if not mismatches else f'有 {mismatches} 筆差異'}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+比較 Scraper 各解析模式的速度，並確認擷取結果與原本的 html.parser 完整解析一致。
+
+用法：
+    python benchmarks/bench_parser.py [--corpus benchmarks/corpus] [--repeat 5]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scraper import Scraper, HAS_LXML  # noqa: E402
+
+BASE_URL = 'https://ctinews.com/news/items/benchmark'
+
+
+def extract_all(soup):
+    scraper = Scraper(BASE_URL, soup=soup)
+    return (scraper.get_content(), scraper.get_all_content_images())
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpus', default=os.path.join(ROOT, 'benchmarks', 'corpus'))
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # 精簡解析只對 lxml 有作用
+    modes = [('html.parser', False)]
+    if HAS_LXML:
+        modes += [('lxml', False), ('lxml', True)]
+    else:
+        print("未安裝 lxml，只比較 html.parser")
+
+    paths = sorted(glob.glob(os.path.join(args.corpus, '*.html')))
+    if not paths:
+        sys.exit(f"找不到語料：{args.corpus}")
+
+    totals = {mode: 0.0 for mode in modes}
+    mismatches = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        baseline = None
+        for mode in modes:
+            elapsed, soup = best_of(lambda: Scraper.parse_html(html, *mode), args.repeat)
+            totals[mode] += elapsed
+            result = extract_all(soup)
+            if baseline is None:
+                baseline = result
+            elif result != baseline:
+                mismatches.append((os.path.basename(path), mode))
+
+    base_time = totals[modes[0]]
+    print(f"{'解析器':<14}{'精簡':<6}{'總時間 (ms)':>14}{'加速':>8}")
+    for mode in modes:
+        print(f"{mode[0]:<14}{'是' if mode[1] else '否':<6}{totals[mode] * 1000:>14.2f}{base_time / totals[mode]:>7.1f}x")
+    print(f"語料 {len(paths)} 頁，擷取結果{'全部一致' if not mismatches else '有差異'}")
+    for name, mode in mismatches:
+        print(f"  差異：{name} ({mode[0]}, 精簡={mode[1]})")
+    if mismatches:
+        print("有差異的解析器不能取代 html.parser，SCRAPER_CONFIG['parser'] 請維持 html.parser")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+完整流程的離線基準測試：抓取、擷取、圖片下載、排版各階段與 PNG 編碼。
+以本機 HTTP 伺服器提供 benchmarks/corpus/ 中的文章頁與圖片，不需要連線到外部網站；
+結果輸出為 JSON，可用 --compare 與之前的結果比較，找出變慢的項目。
+
+用法：
+    python benchmarks/bench_pipeline.py [--repeat 5] [--output results.json]
+    python benchmarks/bench_pipeline.py --compare baseline.json [--threshold 1.25] [--min-delta-ms 0.5]
+"""
+import argparse
+import functools
+import gc
+import http.server
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 不使用共用磁碟快取，避免結果受之前執行的內容影響
+os.environ['CTINEWS_CACHE_PATH'] = ''
+
+import PIL  # noqa: E402
+
+import app  # noqa: E402
+from scraper import Scraper  # noqa: E402
+from timing import PhaseTimer  # noqa: E402
+
+RENDER_PHASES = ('measure', 'download', 'background', 'title', 'content', 'image', 'caption')
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(directory):
+    """在背景執行緒啟動本機 HTTP 伺服器，回傳 (server, base_url)"""
+    handler = functools.partial(_QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def summarize(times):
+    return {'min': min(times), 'median': statistics.median(times)}
+
+
+def measure(func, repeat):
+    """先執行一次暖機，再計時 repeat 次（計時期間停用 GC），回傳 ({min, median}, 最後一次的結果)"""
+    result = func()
+    times = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            times.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return summarize(times), result
+
+
+def localize(url, base_url, fallback):
+    """外部網址（如 storage.ctinews.com）改用本機的範例圖片，確保完全離線"""
+    return url if url.startswith(base_url) else fallback
+
+
+def bench_page(name, url, base_url, repeat, results):
+    scraper = Scraper(url)
+    prefix = f"scrape/{name}"
+    results[f"{prefix}/get_soup"], soup = measure(scraper._get_soup, repeat)
+    for extractor in ('extract_title', 'extract_first_content', 'extract_main_article_image', 'get_all_content_images'):
+        # 每次建立新的 Scraper，避免圖片索引等快取影響計時
+        results[f"{prefix}/{extractor}"], _ = measure(lambda: getattr(Scraper(url, soup=soup), extractor)(), repeat)
+    return Scraper(url, soup=soup).extract_record()
+
+
+def bench_downloads(records, base_url, repeat, results):
+    urls = sorted({image_url for record in records for image_url, _ in record.images if image_url.startswith(base_url)})
+    for image_url in urls:
+        key = f"download/{os.path.basename(urlparse(image_url).path)}"
+        results[key], _ = measure(lambda: Scraper.download_image(image_url).load(), repeat)
+
+
+def render_cases(name, record, base_url, fallback_image):
+    """回傳 [(案例名稱, data, dual_image_data)]：單張圖片模式，文章圖片足夠時再加上雙框模式"""
+    data = record.to_dict()
+    if data['image_url'] != '未找到圖片':
+        data['image_url'] = localize(data['image_url'], base_url, fallback_image)
+    cases = [(f"{name}/single", data, None)]
+    images = record.content_images()
+    if len(images) >= 2:
+        dual = {
+            'title': record.title,
+            'content': record.content,
+            'img1_url': localize(images[0]['image_url'], base_url, fallback_image),
+            'img2_url': localize(images[1]['image_url'], base_url, fallback_image),
+            'alt_text': images[0]['alt_text'],
+            'img1_idx': 1,
+            'img2_idx': 2,
+        }
+        cases.append((f"{name}/dual", dual, dual))
+    return cases
+
+
+def bench_render(case, data, dual_image_data, repeat, results):
+    """
+    排版各階段與 PNG 編碼。圖片原始位元組已在記憶體中（下載另外計時），
+    但每次都清除縮放後的圖片、排版圖層與圖說圖塊，讓各階段包含量測、文字繪製、解碼縮放與描邊繪製。
+    另外計時只修改圖說文字的重新繪製（recaption：底圖取自快取，只重新貼上圖說）。
+    """
+    phases = {phase: [] for phase in RENDER_PHASES}
+    encode = []
+    # 第一次為暖機（下載圖片原始位元組、載入字體），不列入結果
+    for i in range(repeat + 1):
+        app.image_cache.clear()
+        app.layout_engine.clear()
+        app.caption_renderer.clear()
+        gc.collect()
+        gc.disable()
+        try:
+            timer = PhaseTimer()
+            layout_image, _ = app.create_layout_image(data, show_source=True, dual_image_data=dual_image_data,
+                                                      timer=timer)
+            start = time.perf_counter()
+            layout_image.save(io.BytesIO(), format='PNG')
+            encode_time = time.perf_counter() - start
+        finally:
+            gc.enable()
+        if i == 0:
+            continue
+        for phase in RENDER_PHASES:
+            phases[phase].append(timer.phases.get(phase, 0.0))
+        encode.append(encode_time)
+    for phase, times in phases.items():
+        results[f"render/{case}/{phase}"] = summarize(times)
+    results[f"render/{case}/png_encode"] = summarize(encode)
+
+    # 每次使用不同的圖說文字，圖說圖塊不會取自快取
+    edits = [dict(data, alt_text=f"{data.get('alt_text', '')} ({i})") for i in range(repeat + 1)]
+
+    def recaption():
+        edit = edits.pop()
+        return app.create_layout_image(edit, show_source=True, dual_image_data=edit if dual_image_data else None)[0]
+
+    results[f"render/{case}/recaption"], _ = measure(recaption, repeat)
+
+
+def compare(results, baseline, threshold, min_delta):
+    """
+    列出與基準結果的比值（以 min 比較），回傳變慢超過 threshold 倍的項目；
+    增加的時間不到 min_delta 秒的項目受計時誤差影響太大，不列入退步判斷。
+    """
+    regressions = []
+    print(f"{'項目':<48}{'基準 (ms)':>12}{'本次 (ms)':>12}{'比值':>8}")
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        old, new = baseline[key]['min'], results[key]['min']
+        ratio = new / old if old > 0 else float('inf')
+        flag = ''
+        if ratio > threshold and new - old > min_delta:
+            regressions.append(key)
+            flag = '  <-- 變慢'
+        print(f"{key:<48}{old * 1000:>12.3f}{new * 1000:>12.3f}{ratio:>7.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpus', default=os.path.join(ROOT, 'benchmarks', 'corpus'))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='將結果寫入 JSON 檔（預設輸出到標準輸出）')
+    parser.add_argument('--compare', help='與之前輸出的 JSON 結果比較')
+    parser.add_argument('--threshold', type=float, default=1.25, help='比值超過此值視為變慢（預設 1.25）')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5, help='增加的時間超過此值才視為變慢（預設 0.5 ms）')
+    args = parser.parse_args()
+
+    pages = sorted(name for name in os.listdir(args.corpus) if name.endswith('.html'))
+    if not pages:
+        sys.exit(f"找不到語料：{args.corpus}")
+
+    server, base_url = start_server(args.corpus)
+    fallback_image = f"{base_url}/images/cut-main.jpg"
+    results = {}
+    try:
+        records = [bench_page(page[:-len('.html')], f"{base_url}/{page}", base_url, args.repeat, results)
+                   for page in pages]
+        bench_downloads(records, base_url, args.repeat, results)
+        for page, record in zip(pages, records):
+            for case, data, dual_image_data in render_cases(page[:-len('.html')], record, base_url, fallback_image):
+                bench_render(case, data, dual_image_data, args.repeat, results)
+    finally:
+        server.shutdown()
+
+    output = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'platform': platform.platform(),
+            'parser': Scraper.default_parser(),
+            'repeat': args.repeat,
+            'pages': pages,
+        },
+        'results': results,
+    }
+    text = json.dumps(output, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    elif not args.compare:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms / 1000)
+        print(f"共 {len(regressions)} 個項目變慢超過 {args.threshold}x")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
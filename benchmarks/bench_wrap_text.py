@@ -0,0 +1,86 @@
+"""
+wrap_text 斷行效能比較：舊版逐字量測 vs. fonts.LineBreaker。
+
+用法：
+    python benchmarks/bench_wrap_text.py [--font 字體路徑] [--size 28] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import ImageFont  # noqa: E402
+
+from config import LAYOUT_CONFIG  # noqa: E402
+from fonts import LineBreaker  # noqa: E402
+
+SAMPLE_TEXT = (
+    "立法院今（18）日召開院會，針對國防預算進行三讀表決，朝野黨團在議場內針鋒相對。"
+    "行政院長表示，政府將持續推動各項民生政策，並強調「穩定物價」是首要任務。"
+    "According to the report, 2025年第3季GDP成長率為4.2%，優於市場預期。"
+)
+
+
+def wrap_text_reference(text, font, max_width):
+    """舊版 app.wrap_text：每加入一個字就重新量測整行"""
+    lines = []
+    current_line = ""
+    for word in list(text):
+        test_line = current_line + word
+        bbox = font.getbbox(test_line)
+        width = bbox[2] - bbox[0]
+        if width <= max_width:
+            current_line = test_line
+        else:
+            if current_line:
+                lines.append(current_line)
+            current_line = word
+    if current_line:
+        lines.append(current_line)
+    return lines
+
+
+def load_font(path, size):
+    if path is None:
+        path = os.path.join(ROOT, 'static', LAYOUT_CONFIG['title']['font_path_regular'])
+    try:
+        return ImageFont.truetype(path, size)
+    except OSError:
+        print(f"找不到字體 {path}，改用 Pillow 內建字體")
+        return ImageFont.load_default(size)
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--font', default=None)
+    parser.add_argument('--size', type=int, default=LAYOUT_CONFIG['content']['font_size'])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    font = load_font(args.font, args.size)
+    max_width = LAYOUT_CONFIG['layout']['white_area_width'] - LAYOUT_CONFIG['title']['horizontal_padding']
+
+    print(f"{'字數':>6} {'舊版 (ms)':>12} {'新版 (ms)':>12} {'加速':>8}  結果一致")
+    for length in (200, 1000, 5000):
+        text = (SAMPLE_TEXT * (length // len(SAMPLE_TEXT) + 1))[:length]
+        old_time, old_lines = best_of(lambda: wrap_text_reference(text, font, max_width), args.repeat)
+        # 每輪使用新的 LineBreaker，計入字元寬度快取的建立成本
+        new_time, new_lines = best_of(lambda: LineBreaker(font).wrap(text, max_width), args.repeat)
+        print(f"{length:>6} {old_time * 1000:>12.2f} {new_time * 1000:>12.2f} "
+              f"{old_time / new_time:>7.1f}x  {'是' if old_lines == new_lines else '否'}")
+
+
+if __name__ == '__main__':
+    main()
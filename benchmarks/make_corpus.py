@@ -0,0 +1,178 @@
+"""
+產生離線基準測試用的範例語料：仿照中天新聞網文章頁結構的 HTML 與範例圖片。
+
+用法：
+    python benchmarks/make_corpus.py [--out benchmarks/corpus]
+
+產生的檔案已提交在 benchmarks/corpus/，只有在修改此腳本後才需要重新執行。
+若要以實際網頁測試，可將另存的文章頁 (*.html) 直接放進同一個資料夾。
+"""
+import argparse
+import json
+import os
+import random
+
+from PIL import Image, ImageDraw
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PARAGRAPH = (
+    "立法院今（18）日召開院會，針對國防預算進行三讀表決，朝野黨團在議場內針鋒相對，"
+    "執政黨團強調預算編列符合實際需求，在野黨團則質疑部分項目缺乏詳細說明。"
+    "行政院長在會後受訪時表示，政府將持續推動各項民生政策，並強調「穩定物價」是首要任務。"
+)
+
+SUB_MENU = ''.join(f'<li><a href="/category/sub/{j}"><span>子分類{j}</span></a></li>' for j in range(8))
+NAV = ''.join(
+    f'<li class="nav-item"><a href="/category/{i}"><span class="label">分類{i}</span></a>'
+    f'<ul class="sub-menu">{SUB_MENU}</ul></li>'
+    for i in range(30)
+)
+FOOTER_LINKS = ''.join(f'<a href="/about/{i}">關於我們 {i}</a>' for i in range(40))
+
+
+def _next_data(seed):
+    """模擬 Next.js 頁面中體積龐大的 __NEXT_DATA__ JSON"""
+    rng = random.Random(seed)
+    items = [{
+        'id': f'item{rng.randrange(10 ** 8)}',
+        'title': PARAGRAPH[:rng.randrange(10, 60)],
+        'cover': f'https://storage.ctinews.com/compression/files/default/cut-{rng.randrange(10 ** 6)}.jpg',
+        'tags': [f'標籤{rng.randrange(100)}' for _ in range(5)],
+    } for _ in range(300)]
+    return json.dumps({'props': {'pageProps': {'related': items}}}, ensure_ascii=False)
+
+
+def _scripts(seed):
+    return (
+        '<script>window.dataLayer=window.dataLayer||[];function gtag(){dataLayer.push(arguments)}'
+        'if (a < b && "</div>") { document.write("<!-- x -->"); }</script>'
+        f'<script id="__NEXT_DATA__" type="application/json">{_next_data(seed)}</script>'
+        '<style>.article-content p{line-height:1.8}.logo img{height:40px}</style>'
+        '<!-- 廣告版位 <img src="/ad-comment.jpg"> -->'
+    )
+
+
+def _header():
+    return (
+        '<header class="site-header"><div class="logo"><img src="/images/logo.png" alt="中天新聞網 logo"></div>'
+        f'<nav><ul>{NAV}</ul></nav>'
+        '<a class="share" href="#"><img src="/images/icon-facebook.svg" alt="facebook"></a>'
+        '<a class="share" href="#"><img src="/images/icon-line.svg" alt="分享"></a></header>'
+    )
+
+
+def _related(seed):
+    rng = random.Random(seed)
+    cards = ''.join(
+        f'<div class="card"><img src="https://storage.ctinews.com/compression/files/default/thumb-{rng.randrange(10 ** 6)}_80x80.jpg"'
+        f' alt="相關新聞縮圖"><p>{PARAGRAPH[:30]}</p></div>'
+        for _ in range(40)
+    )
+    return f'<aside class="related"><h2>相關新聞</h2>{cards}</aside>'
+
+
+def _page(title, body, seed):
+    return (
+        '<!DOCTYPE html><html lang="zh-TW"><head><meta charset="utf-8">'
+        f'<title>{title} | 中天新聞網</title>{_scripts(seed)}</head><body>'
+        f'{_header()}<main class="main-wrapper">{body}{_related(seed)}</main>'
+        f'<footer>{FOOTER_LINKS}<img src="/images/footer-logo.png" alt="logo"></footer>'
+        f'{_scripts(seed + 1)}</body></html>'
+    )
+
+
+def build_pages():
+    """回傳 {檔名: HTML}；圖片網址以相對路徑表示，由本機測試伺服器提供"""
+    pages = {}
+
+    pages['standard.html'] = _page('賴清德出席國防預算記者會', (
+        '<article class="article-content">'
+        '<h1>立法院三讀通過國防預算案 朝野攻防激烈</h1>'
+        '<div class="author">記者 王小明／台北報導</div>'
+        '<figure><img src="/images/cut-main.jpg" alt="立委在議場內發言。（圖／資料照／中天新聞）"'
+        ' loading="eager" width="1200" height="675"><figcaption>立委在議場內發言。</figcaption></figure>'
+        f'<p>短段落。</p><p>{PARAGRAPH}</p><p>{PARAGRAPH}</p>'
+        '<figure><img src="/images/cut-second.jpg" alt=""><figcaption>議場外的抗議民眾（翻攝畫面）</figcaption></figure>'
+        f'<p>{PARAGRAPH}</p>'
+        '<figure><img src="/images/cut-third.jpg" alt="行政院長受訪畫面（圖片來源：行政院）" loading="lazy"></figure>'
+        f'<p>{PARAGRAPH}</p></article>'
+    ), 1)
+
+    pages['lazyload.html'] = _page('颱風最新動態', (
+        '<div class="news-content">'
+        '<h1>颱風外圍環流影響 北部山區慎防豪雨</h1>'
+        '<figure><img class="lazy" data-src="https://storage.ctinews.com/compression/files/default/cut-typhoon.jpg"'
+        ' src="data:image/gif;base64,R0lGODlhAQABAAAAACw=" alt="">'
+        '<noscript><img src="https://storage.ctinews.com/compression/files/default/cut-typhoon.jpg" alt="颱風路徑圖"></noscript>'
+        '</figure><p style="text-align: center">颱風路徑潛勢預報圖（圖／中央氣象署）</p>'
+        f'<p>{PARAGRAPH}</p>'
+        '<img data-srcset="/images/cut-second.jpg 1x, /images/cut-second@2x.jpg 2x" alt="">'
+        '<figcaption>民眾撐傘出門（資料照／中天新聞）</figcaption>'
+        f'<p>{PARAGRAPH}</p></div>'
+    ), 2)
+
+    pages['figcaption.html'] = _page('藝人出席記者會', (
+        '<article><div class="post-body">'
+        '<h1>知名藝人出席新片記者會 分享拍攝趣事</h1>'
+        f'<p>{PARAGRAPH}</p>'
+        '<div class="photo"><figcaption>記者會現場（圖／記者李小華攝）</figcaption><img src="images/cut-main.jpg" alt=""></div>'
+        '<figure><img src="/images/cut-third.jpg" alt=""></figure>'
+        '<p>圖為新片劇照，翻攝自片商臉書。這是一段比較長的說明文字，用來測試圖說擷取的邏輯是否正確。</p>'
+        f'<p>{PARAGRAPH}</p></div></article>'
+    ), 3)
+
+    pages['no_photo.html'] = _page('影音新聞', (
+        '<section class="video-page">'
+        '<h1>短</h1>'
+        '<div class="player"><img src="/images/play-button.png" alt="播放"></div>'
+        f'<p>{PARAGRAPH}</p></section>'
+    ), 4)
+
+    # 編輯後台常見的不正確標記：未關閉的 <p> 內夾著圖片區塊，
+    # html.parser 與 lxml 修正的方式不同，用來確認擷取結果仍與 html.parser 一致
+    pages['malformed.html'] = _page('地方新聞', (
+        '<div class="article-content">'
+        '<h1>縣市首長出席地方活動 宣布新建設計畫'
+        '<p>記者 陳小美／台中報導'
+        '<div class="photo"><img src="/images/cut-main.jpg" alt="縣長出席活動（圖／記者陳小美攝）"></div>'
+        f'<p>{PARAGRAPH}'
+        '<div><img src="/images/cut-second.jpg" alt=""></div>'
+        f'<p>{PARAGRAPH}<br>'
+        '<figure><img src="/images/cut-third.jpg" alt=""><figcaption>活動現場（翻攝畫面）</figure>'
+        '</div>'
+    ), 5)
+
+    return pages
+
+
+def build_images():
+    """回傳 {檔名: PIL Image}，尺寸接近實際新聞照片"""
+    images = {}
+    for name, size, color in (('cut-main.jpg', (2400, 1350), (180, 40, 40)),
+                              ('cut-second.jpg', (1920, 1280), (40, 140, 60)),
+                              ('cut-third.jpg', (3000, 2000), (40, 70, 170))):
+        image = Image.new('RGB', size, color)
+        draw = ImageDraw.Draw(image)
+        for i in range(0, size[0], 240):
+            draw.rectangle([i, size[1] // 3, i + 120, size[1] * 2 // 3], fill=(240, 240, 240))
+        images[name] = image
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--out', default=os.path.join(HERE, 'corpus'))
+    args = parser.parse_args()
+
+    os.makedirs(os.path.join(args.out, 'images'), exist_ok=True)
+    for name, html in build_pages().items():
+        with open(os.path.join(args.out, name), 'w', encoding='utf-8') as f:
+            f.write(html)
+    for name, image in build_images().items():
+        image.save(os.path.join(args.out, 'images', name), quality=85)
+    print(f"已產生語料於 {args.out}")
+
+
+if __name__ == '__main__':
+    main()
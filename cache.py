@@ -0,0 +1,124 @@
+"""
+記憶體快取模組。
+提供同時限制項目數量與估計記憶體用量的 LRU 快取，並以 TTL 淘汰過期資料。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    LRU + TTL 快取。
+    每次命中都會延長該項目的存活時間，因此最久未使用的項目永遠位於最前端，
+    清除過期項目時只需從前端開始檢查。
+    """
+    def __init__(self, name, max_entries, max_bytes, ttl, sizeof=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: 0)
+        self._data = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key):
+        value, size, _ = self._data.pop(key)
+        self._bytes -= size
+        return value
+
+    def _sweep(self, now):
+        while self._data:
+            key, (_, _, expires_at) = next(iter(self._data.items()))
+            if expires_at > now:
+                break
+            self._remove(key)
+            self.expirations += 1
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[2] <= now:
+                if entry is not None:
+                    self._remove(key)
+                    self.expirations += 1
+                self.misses += 1
+                return default
+            value, size, _ = entry
+            # 命中時延長快取壽命並移到最後
+            self._data[key] = (value, size, now + self.ttl)
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size=None):
+        """存入項目；size 未指定時以 sizeof 估計，超過整體上限的單一項目不會被快取"""
+        if size is None:
+            size = self.sizeof(value)
+        now = time.time()
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._sweep(now)
+            if size > self.max_bytes:
+                return
+            self._data[key] = (value, size, now + self.ttl)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._remove(key)
+
+    def sweep(self):
+        """清除所有已過期的項目"""
+        with self._lock:
+            self._sweep(time.time())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[2] > time.time()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self):
+        """回傳快取統計資料，供監控使用"""
+        with self._lock:
+            return {
+                'name': self.name,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+            }
+
+
+def estimate_image_bytes(image):
+    """估計 PIL 圖片解碼後佔用的記憶體"""
+    if image is None:
+        return 0
+    width, height = image.size
+    return width * height * len(image.getbands())
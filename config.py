@@ -2,6 +2,8 @@
 這個檔案集中管理圖片生成的所有版面設計參數。
 修改此處的數值可以直接影響最終生成圖片的樣式，而無需更動 app.py 中的核心邏輯。
 """
+import os
+import tempfile
 
 LAYOUT_CONFIG = {
     # --- 整體版面配置 ---
@@ -58,4 +60,144 @@ LAYOUT_CONFIG = {
         "source_text_vertical_margin": 60,
         "source_text_stroke_width": 3,
     }
-}
\ No newline at end of file
+}
+
+# --- 效能與快取設定 ---
+CACHE_CONFIG = {
+    # 字體快取：每個 worker 最多保留的字體 (路徑, 大小) 組合數量
+    "font_max_entries": 32,
+    # 資料來源文字圖塊快取的最大數量
+    "caption_max_entries": 64,
+    # 排版量測結果（標題與內文的斷行）的快取數量
+    "layout_measure_max_entries": 256,
+    # 排版圖層快取：標題與內文的文字圖層，以及不含圖說的底圖（每張約 6 MB）
+    "layer_max_entries": 128,
+    "layer_max_bytes": 64 * 1024 * 1024,
+    "layout_base_max_entries": 8,
+    "layout_base_max_bytes": 64 * 1024 * 1024,
+    # 網頁與圖片快取：存活時間（秒），命中時會自動延長
+    "ttl": 600,
+    # 文章擷取紀錄快取的項目數量與估計記憶體上限
+    "page_max_entries": 256,
+    "page_max_bytes": 8 * 1024 * 1024,
+    # 圖片原始位元組（壓縮後）快取的項目數量與記憶體上限
+    "image_bytes_max_entries": 256,
+    "image_bytes_max_bytes": 128 * 1024 * 1024,
+    # 已解碼並縮放成版面尺寸的圖片快取的項目數量與估計記憶體上限
+    "image_max_entries": 48,
+    "image_max_bytes": 256 * 1024 * 1024,
+    # 跨 worker 共用的磁碟快取（SQLite），設為 None 則停用
+    # 多個 worker 時需啟用，/rendered 圖片請求才能由任何 worker 取得
+    "shared_cache_path": os.environ.get(
+        'CTINEWS_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'ctinews_cache', 'shared.sqlite3')
+    ),
+    "shared_article_ttl": 600,
+    "shared_article_max_bytes": 32 * 1024 * 1024,
+    "shared_image_ttl": 24 * 60 * 60,
+    "shared_image_max_bytes": 1024 * 1024 * 1024,
+    # 並行下載圖片的執行緒數量（同時也用於背景預取文章中的其他圖片）
+    "image_fetch_workers": 4,
+    # 背景預取文章其他圖片的執行緒數量（與前景下載分開，避免預取拖慢使用者正在等待的圖片）
+    "image_prefetch_workers": 1,
+    # 已編碼的最終排版圖快取（以所有繪圖輸入的雜湊值為鍵）
+    "render_max_entries": 32,
+    "render_max_bytes": 128 * 1024 * 1024,
+    "shared_render_ttl": 60 * 60,
+    "shared_render_max_bytes": 512 * 1024 * 1024,
+}
+
+# --- HTTP 連線設定 ---
+HTTP_CONFIG = {
+    # 連線池數量（約等於會連線的主機數，如 ctinews.com 與 storage.ctinews.com）
+    "pool_connections": 4,
+    # 每個主機最多保留的 keep-alive 連線數，應不小於圖片下載執行緒數量
+    "pool_maxsize": 8,
+    "connect_timeout": 5,
+    "page_read_timeout": 20,
+    "image_read_timeout": 10,
+    # 圖片以串流分段下載：單張上限、每段大小，以及讀取多少位元組內必須辨識出圖片格式與尺寸
+    "image_max_bytes": 20 * 1024 * 1024,
+    "image_chunk_size": 64 * 1024,
+    "image_sniff_bytes": 256 * 1024,
+    # 圖片像素上限（約 8000x6000），超過時不下載其餘內容
+    "image_max_pixels": 50_000_000,
+    # /cache_stats 中保留最近幾次下載的耗時與大小
+    "download_log_size": 20,
+    # 連線錯誤或 429/5xx 時的重試次數與退避係數（秒）
+    "retries": 2,
+    "backoff_factor": 0.3,
+}
+
+# --- 網頁解析設定 ---
+SCRAPER_CONFIG = {
+    # BeautifulSoup 解析器：預設為內建的 html.parser。
+    # "lxml"（或 "auto"：有安裝 lxml 時使用）解析快很多，但 lxml 修正不正確標記的方式不同，
+    # 例如 <p> 內的 <div> 會讓 html.parser 與 lxml 取得不同的段落，擷取結果可能改變；
+    # 改用前應以實際頁面加入 benchmarks/corpus，並確認 benchmarks/bench_parser.py 沒有差異
+    "parser": "html.parser",
+    # 使用 lxml 時的精簡解析：建樹前剪除擷取邏輯用不到的子樹，結果與 lxml 完整解析相同
+    "restricted_parse": True,
+    # 批次擷取：每個主機同時進行的請求數，以及執行下載與解析的執行緒數量
+    "batch_per_host_limit": 4,
+    "batch_workers": 8,
+}
+
+# --- 批次繪製設定 ---
+BATCH_CONFIG = {
+    # 繪製排版圖的行程數量，None 表示使用全部 CPU 核心
+    # （每個 gunicorn worker 各有一個行程池，多 worker 部署時應相應調低）
+    "render_workers": None,
+    # 單次批次請求最多的項目數量
+    "max_items": 50,
+}
+
+# --- 背景排版工作設定 ---
+JOB_CONFIG = {
+    # 每個 worker 行程同時執行的排版工作數量
+    "workers": 2,
+    # 已結束的工作保留多久（秒）供查詢，以及每個行程最多保留的已結束工作數量
+    "ttl": 600,
+    "max_jobs": 200,
+    # 每個行程排隊中與執行中工作的上限，達到上限時 /jobs 回傳 429
+    "max_pending": 20,
+    # 工作狀態寫入共用磁碟快取的容量上限
+    "shared_max_bytes": 8 * 1024 * 1024,
+}
+
+# --- 請求剖析設定 ---
+PROFILE_CONFIG = {
+    # 剖析結果（.pstats、.collapsed、.json）的存放目錄，設為空字串則停用
+    "directory": os.environ.get(
+        'CTINEWS_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'ctinews_profiles')
+    ),
+    # 未要求剖析的 /generate_image、/api/render 請求與背景排版工作中被抽樣剖析的比例，0 表示只在要求時剖析
+    "sample_rate": float(os.environ.get('CTINEWS_PROFILE_SAMPLE_RATE', '0')),
+    # 呼叫堆疊的取樣間隔（秒）
+    "sample_interval": 0.005,
+    # 目錄中最多保留的剖析結果數量
+    "max_profiles": 100,
+}
+
+# --- 執行期指標設定 ---
+METRICS_CONFIG = {
+    # 是否讓本機（127.0.0.1／::1）來源不需登入或 API 金鑰即可讀取 /metrics；
+    # 放在同一台主機的反向代理之後時所有外部請求都來自本機，因此預設關閉
+    "allow_loopback": os.environ.get('CTINEWS_METRICS_ALLOW_LOOPBACK', '') == '1',
+}
+
+# --- 輸出格式設定 ---
+OUTPUT_CONFIG = {
+    # 未指定時使用的格式：png、jpeg 或 webp
+    "default_format": "png",
+    # PNG 壓縮等級 0–9：數字越小編碼越快、檔案越大（zlib 預設為 6）
+    "png_compress_level": 6,
+    # JPEG／WebP 的預設品質（1–95／1–100）
+    "jpeg_quality": 90,
+    "webp_quality": 85,
+    # JPEG 色度取樣：4:4:4 保留最多色彩細節，4:2:0 檔案最小
+    "jpeg_subsampling": "4:2:0",
+    # WebP 編碼的壓縮方法 0–6：數字越小越快
+    "webp_method": 4,
+    # 預覽模式：輸出尺寸縮小的倍數，並使用最快的編碼設定
+    "preview_reduce": 2,
+}
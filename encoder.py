@@ -0,0 +1,118 @@
+"""
+排版圖的輸出編碼。
+PNG 可調整壓縮等級，JPEG 與 WebP 可調整品質（JPEG 另可調整色度取樣）；
+預覽模式會縮小輸出尺寸並使用最快的編碼設定，供編輯先確認版面，再輸出高品質的最終版本。
+"""
+import io
+import time
+
+from config import OUTPUT_CONFIG
+
+# 格式 -> (MIME 類型, 副檔名)
+FORMATS = {
+    'png': ('image/png', 'png'),
+    'jpeg': ('image/jpeg', 'jpg'),
+    'webp': ('image/webp', 'webp'),
+}
+FORMAT_ALIASES = {'jpg': 'jpeg'}
+SUBSAMPLINGS = ('4:4:4', '4:2:2', '4:2:0')
+
+
+class OutputFormat:
+    """
+    一組輸出設定。quality 只用於 JPEG／WebP，compress_level 只用於 PNG，subsampling 只用於 JPEG
+    （有損 WebP 固定為 4:2:0）；不適用於該格式的設定在正規化時會被清除，不影響快取鍵。
+    """
+    __slots__ = ('format', 'quality', 'compress_level', 'subsampling', 'preview')
+
+    def __init__(self, format=None, quality=None, compress_level=None, subsampling=None, preview=False):
+        cfg = OUTPUT_CONFIG
+        format = (format or cfg['default_format']).lower()
+        format = FORMAT_ALIASES.get(format, format)
+        if format not in FORMATS:
+            raise ValueError(f"不支援的輸出格式：{format}（可用 png、jpeg、webp）。")
+        self.format = format
+        self.preview = bool(preview)
+        self.quality = None
+        self.compress_level = None
+        self.subsampling = None
+
+        if format == 'png':
+            self.compress_level = _bounded_int(compress_level, cfg['png_compress_level'], 0, 9, "PNG 壓縮等級")
+        else:
+            default_quality = cfg['jpeg_quality'] if format == 'jpeg' else cfg['webp_quality']
+            self.quality = _bounded_int(quality, default_quality, 1, 95 if format == 'jpeg' else 100, "品質")
+        if format == 'jpeg':
+            self.subsampling = subsampling or cfg['jpeg_subsampling']
+            if self.subsampling not in SUBSAMPLINGS:
+                raise ValueError(f"色度取樣必須是 {'、'.join(SUBSAMPLINGS)} 其中之一。")
+
+    @classmethod
+    def from_options(cls, options):
+        """由 API 的 output 物件或表單轉換出的 dict 建立；options 為 None 時使用預設值"""
+        if options is None:
+            return cls()
+        if not isinstance(options, dict):
+            raise ValueError("output 必須是物件。")
+        return cls(format=options.get('format'), quality=options.get('quality'),
+                   compress_level=options.get('compress_level'), subsampling=options.get('subsampling'),
+                   preview=options.get('preview') in (True, 'on', '1', 'true'))
+
+    @property
+    def mimetype(self):
+        return FORMATS[self.format][0]
+
+    @property
+    def extension(self):
+        return FORMATS[self.format][1]
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def cache_key(self):
+        """放入排版快取鍵的字串，相同的設定一定得到相同的字串"""
+        return ':'.join(str(getattr(self, name)) for name in self.__slots__)
+
+    def encode(self, image):
+        """將排版圖編碼為位元組，回傳 (位元組, 編碼秒數)"""
+        start = time.perf_counter()
+        if self.preview:
+            # reduce 以區塊平均縮小，比 resize 快得多，預覽品質已足夠
+            image = image.reduce(OUTPUT_CONFIG['preview_reduce'])
+        buffer = io.BytesIO()
+        if self.format == 'png':
+            image.save(buffer, format='PNG', compress_level=1 if self.preview else self.compress_level)
+        elif self.format == 'jpeg':
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image.save(buffer, format='JPEG', quality=self.quality, subsampling=self.subsampling)
+        else:
+            image.save(buffer, format='WEBP', quality=self.quality,
+                       method=0 if self.preview else OUTPUT_CONFIG['webp_method'])
+        return buffer.getvalue(), time.perf_counter() - start
+
+
+def _bounded_int(value, default, low, high, label):
+    if value is None or value == '':
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{label}必須是數字。")
+    if not low <= value <= high:
+        raise ValueError(f"{label}必須介於 {low} 到 {high} 之間。")
+    return value
+
+
+def sniff_mimetype(data):
+    """由檔頭判斷已編碼圖片的 MIME 類型（共用快取中只保存位元組）"""
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if data[:3] == b'\xff\xd8\xff':
+        return 'image/jpeg'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+
+DEFAULT_OUTPUT = OutputFormat()
@@ -0,0 +1,82 @@
+"""
+圖片並行下載模組。
+以固定大小的執行緒池下載圖片；同一張圖同時只會有一個下載工作，
+前景請求與背景預取共用同一個 Future。
+背景預取使用另一個較小的執行緒池，大量預取不會佔住前景下載的執行緒；
+前景需要的圖片若還排在預取佇列中，會改由前景執行緒池下載。
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ImageFetcher:
+    """
+    load(url) 為實際取得圖片的函式（通常會經過快取），由執行緒池呼叫。
+    max_workers 為前景下載的執行緒數量，prefetch_workers 為背景預取的執行緒數量。
+    """
+    def __init__(self, load, max_workers=4, prefetch_workers=1):
+        self.load = load
+        self.max_workers = max_workers
+        self.prefetch_workers = prefetch_workers
+        self._executor = None
+        self._prefetch_executor = None
+        self._pid = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.prefetched = 0
+
+    def _get_executor(self, background=False):
+        # 執行緒池不能跨 fork 使用，每個 worker 行程各自建立
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='image-fetch')
+            self._prefetch_executor = ThreadPoolExecutor(max_workers=self.prefetch_workers,
+                                                         thread_name_prefix='image-prefetch')
+            self._pid = os.getpid()
+            self._inflight = {}
+        return self._prefetch_executor if background else self._executor
+
+    def submit(self, url, background=False):
+        """
+        提交下載工作；若該網址已在下載中則回傳同一個 Future。
+        前景請求遇到尚未開始的預取工作時會取消它，改在前景執行緒池下載。
+        """
+        while True:
+            with self._lock:
+                future = self._inflight.get(url)
+                if future is not None and future.cancelled():
+                    # 已被取消、但回呼還沒移除登記（回呼在提交者註冊後才會執行），直接移除以免重複取消
+                    del self._inflight[url]
+                    future = None
+                if future is None:
+                    future = self._get_executor(background).submit(self.load, url)
+                    future.background = background
+                    self._inflight[url] = future
+                    break
+                if background or not future.background:
+                    return future
+            # 取消時回呼會立即在目前執行緒執行（需要取得鎖），因此在鎖外取消；
+            # 已開始下載的預取工作無法取消，直接等待它完成。
+            # 取消成功後回到迴圈，由上方移除登記並改在前景執行緒池提交
+            if not future.cancel():
+                return future
+        # 工作可能已經完成，此時回呼會立即在目前執行緒執行，因此不能在持有鎖時註冊
+        future.add_done_callback(lambda done, url=url: self._done(url, done))
+        return future
+
+    def _done(self, url, future):
+        with self._lock:
+            if self._inflight.get(url) is future:
+                del self._inflight[url]
+
+    def fetch_many(self, urls):
+        """並行下載多張圖片，依輸入順序回傳結果（空網址回傳 None）"""
+        futures = [self.submit(url) if url else None for url in urls]
+        return [future.result() if future else None for future in futures]
+
+    def prefetch(self, urls):
+        """在背景執行緒池下載圖片，不等待結果"""
+        for url in urls:
+            if url:
+                self.submit(url, background=True)
+                self.prefetched += 1
@@ -0,0 +1,158 @@
+"""
+字體快取模組。
+每個 worker 行程只解析一次同一組 (字體檔, 大小)，避免每次繪圖都重新讀取數 MB 的中文字體檔。
+"""
+import os
+import threading
+import weakref
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+
+from PIL import ImageFont
+
+
+class FontRegistry:
+    """
+    以 LRU 方式保存已載入的 FreeTypeFont 物件，並記錄命中/未命中次數。
+    已知不存在的字體檔直接拋出 OSError，這類查詢另外計入 missing，不算命中。
+    """
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._fonts = OrderedDict()
+        self._missing = set()  # 記錄找不到的字體路徑，避免每次都重新嘗試讀檔
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.missing = 0
+        self.evictions = 0
+
+    def truetype(self, path, size, index=0):
+        """取得指定路徑與大小的字體；找不到檔案時拋出 OSError（與 ImageFont.truetype 相同）"""
+        key = (path, size, index)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self.hits += 1
+                self._fonts.move_to_end(key)
+                return font
+            if path in self._missing:
+                self.missing += 1
+                raise OSError(f"cannot open resource: {path}")
+            self.misses += 1
+
+        try:
+            font = ImageFont.truetype(path, size, index=index)
+        except OSError:
+            # Pillow 對各種讀取錯誤都拋出 OSError；只有檔案確實不存在時才記住，其他錯誤下次仍會重試
+            if not os.path.isfile(path):
+                with self._lock:
+                    self._missing.add(path)
+            raise
+
+        with self._lock:
+            self._fonts[key] = font
+            self._fonts.move_to_end(key)
+            while len(self._fonts) > self.max_entries:
+                self._fonts.popitem(last=False)
+                self.evictions += 1
+        return font
+
+    def preload(self, specs):
+        """預先載入 (路徑, 大小) 清單中的字體，找不到的檔案會被略過"""
+        for path, size in specs:
+            try:
+                self.truetype(path, size)
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._fonts.clear()
+            self._missing.clear()
+
+    def stats(self):
+        """回傳快取統計資料，供監控使用"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'missing': self.missing,
+                'evictions': self.evictions,
+                'entries': len(self._fonts),
+                'max_entries': self.max_entries,
+            }
+
+
+class LineBreaker:
+    """
+    以快取的單字元寬度 (advance) 進行斷行。
+    先用寬度估計每行可容納的字數，再用 font.getbbox 在斷點附近校正，
+    因此斷行結果與逐字量測整行寬度的舊做法一致，但每行只需少數幾次量測。
+    """
+    def __init__(self, font):
+        self.font = font
+        self._advances = {}
+
+    def advance(self, char):
+        """取得單一字元的寬度（每個字體只量測一次）"""
+        width = self._advances.get(char)
+        if width is None:
+            width = self.font.getlength(char)
+            self._advances[char] = width
+        return width
+
+    def measure(self, text):
+        """取得文字實際繪製寬度，與 wrap_text 舊版判斷方式相同"""
+        bbox = self.font.getbbox(text)
+        return bbox[2] - bbox[0]
+
+    def wrap(self, text, max_width):
+        """將文字依最大寬度切成多行"""
+        if not text:
+            return []
+
+        advances = [self.advance(char) for char in text]
+        length = len(text)
+
+        # 中文字幾乎都是等寬字：所有字元寬度相同時可直接用除法估計，不需前綴和
+        uniform_advance = advances[0] if advances[0] > 0 and advances.count(advances[0]) == length else None
+        if uniform_advance is None:
+            prefix = [0.0]
+            prefix.extend(accumulate(advances))
+
+        lines = []
+        start = 0
+        while start < length:
+            if uniform_advance is not None:
+                end = start + int(max_width // uniform_advance)
+            else:
+                end = bisect_right(prefix, prefix[start] + max_width) - 1
+            end = min(max(end, start + 1), length)
+
+            # 在估計的斷點附近用實際量測校正
+            if self.measure(text[start:end]) <= max_width:
+                while end < length and self.measure(text[start:end + 1]) <= max_width:
+                    end += 1
+            else:
+                while end > start + 1 and self.measure(text[start:end]) > max_width:
+                    end -= 1
+
+            lines.append(text[start:end])
+            start = end
+
+        return lines
+
+
+_line_breakers = weakref.WeakKeyDictionary()
+_line_breakers_lock = threading.Lock()
+
+
+def get_line_breaker(font):
+    """取得與字體綁定的 LineBreaker，字體被回收時一併釋放"""
+    with _line_breakers_lock:
+        breaker = _line_breakers.get(font)
+        if breaker is None:
+            breaker = LineBreaker(font)
+            _line_breakers[font] = breaker
+        return breaker
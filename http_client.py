@@ -0,0 +1,146 @@
+"""
+共用的 HTTP 連線模組。
+每個 worker 行程共用一個 requests.Session，依主機保留連線池並重複使用 keep-alive 連線，
+避免每次抓取網頁或圖片都重新建立 TCP/TLS 連線。
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import HTTP_CONFIG
+
+
+class DownloadAborted(Exception):
+    """串流下載因超過大小上限或內容檢查不通過而提前中止"""
+
+
+class HttpClient:
+    """
+    包裝 requests.Session：每個主機一個連線池、分開的連線/讀取逾時、
+    有限次數的退避重試，並統計連線重複使用的情形。
+    """
+    def __init__(self, pool_connections=4, pool_maxsize=8, connect_timeout=5, read_timeout=20,
+                 retries=2, backoff_factor=0.3, download_log_size=20):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._downloads = deque(maxlen=download_log_size)
+        self._download_totals = {'count': 0, 'ok': 0, 'aborted': 0, 'errors': 0, 'bytes': 0, 'seconds': 0.0}
+        self._download_lock = threading.Lock()
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False,
+        )
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+    def get(self, url, read_timeout=None, **kwargs):
+        """發送 GET 請求；逾時以 (連線逾時, 讀取逾時) 分開設定"""
+        kwargs.setdefault('timeout', (self.connect_timeout, read_timeout or self.read_timeout))
+        return self.session.get(url, **kwargs)
+
+    def download(self, url, max_bytes, inspect=None, read_timeout=None, chunk_size=64 * 1024, **kwargs):
+        """
+        串流下載並回傳內容位元組，每次下載的耗時與大小都會記錄在 stats()['downloads']。
+        Content-Length 或已收到的位元組超過 max_bytes 時立即中止；
+        inspect(已收到的位元組) 回傳 True 表示檢查完成，回傳 False 表示需要更多資料，
+        拋出 DownloadAborted 則中止下載。中止時會直接關閉連線，不再讀取剩餘內容。
+        """
+        start = time.perf_counter()
+        record = {'url': url, 'status': 'error', 'reason': None, 'bytes': 0, 'ttfb': None, 'seconds': None}
+        body = bytearray()
+        try:
+            with self.get(url, read_timeout=read_timeout, stream=True, **kwargs) as response:
+                record['ttfb'] = round(time.perf_counter() - start, 4)
+                response.raise_for_status()
+                length = response.headers.get('Content-Length', '')
+                if length.isdigit() and int(length) > max_bytes:
+                    raise DownloadAborted(f"Content-Length {length} 超過上限 {max_bytes}")
+                inspecting = inspect is not None
+                for chunk in response.iter_content(chunk_size):
+                    body += chunk
+                    if len(body) > max_bytes:
+                        raise DownloadAborted(f"內容超過上限 {max_bytes}")
+                    if inspecting:
+                        inspecting = not inspect(body)
+            record['status'] = 'ok'
+            return bytes(body)
+        except DownloadAborted as e:
+            record['status'] = 'aborted'
+            record['reason'] = str(e)
+            raise
+        except Exception as e:
+            record['reason'] = type(e).__name__
+            raise
+        finally:
+            record['bytes'] = len(body)
+            record['seconds'] = round(time.perf_counter() - start, 4)
+            self._record_download(record)
+
+    def _record_download(self, record):
+        with self._download_lock:
+            self._downloads.append(record)
+            totals = self._download_totals
+            totals['count'] += 1
+            totals[{'ok': 'ok', 'aborted': 'aborted'}.get(record['status'], 'errors')] += 1
+            totals['bytes'] += record['bytes']
+            totals['seconds'] += record['seconds']
+
+    def stats(self):
+        """回傳各主機連線池的請求數與新建連線物件數，兩者差值即為重複使用連線的次數"""
+        hosts = {}
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                'requests': pool.num_requests,
+                'connections': pool.num_connections,
+                'reused': max(pool.num_requests - pool.num_connections, 0),
+            }
+        with self._download_lock:
+            downloads = dict(self._download_totals, seconds=round(self._download_totals['seconds'], 3),
+                             recent=list(self._downloads))
+        return {
+            'downloads': downloads,
+            'requests': sum(h['requests'] for h in hosts.values()),
+            'connections': sum(h['connections'] for h in hosts.values()),
+            'reused': sum(h['reused'] for h in hosts.values()),
+            'hosts': hosts,
+        }
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """取得本行程共用的 HttpClient（fork 後的 worker 會各自建立新的連線池）"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = HttpClient(
+                pool_connections=HTTP_CONFIG['pool_connections'],
+                pool_maxsize=HTTP_CONFIG['pool_maxsize'],
+                connect_timeout=HTTP_CONFIG['connect_timeout'],
+                read_timeout=HTTP_CONFIG['page_read_timeout'],
+                retries=HTTP_CONFIG['retries'],
+                backoff_factor=HTTP_CONFIG['backoff_factor'],
+                download_log_size=HTTP_CONFIG['download_log_size'],
+            )
+            _client_pid = os.getpid()
+        return _client
@@ -0,0 +1,184 @@
+"""
+背景排版工作佇列。
+耗時的抓取、下載與繪製交給本行程的執行緒池處理，請求只需取得工作編號後立即返回，
+之後再以編號查詢進度；工作狀態同時寫入共用磁碟快取，讓任何 worker 都能回應查詢。
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# 排版工作依序經過的階段
+STAGES = ('fetch', 'extract', 'download', 'render', 'encode')
+
+
+class QueueFull(Exception):
+    """排隊中與執行中的工作已達上限，暫時不接受新工作"""
+
+
+class Job:
+    """單一工作的狀態：queued → running → done / failed"""
+    __slots__ = ('id', 'status', 'stage', 'stages', 'created_at', 'finished_at', 'result', 'error')
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = 'queued'
+        self.stage = None
+        self.stages = []  # [[階段名稱, 開始時間, 耗時秒數或 None]]
+        self.created_at = time.time()
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    def enter(self, stage):
+        """進入新階段，並結算上一個階段的耗時"""
+        now = time.time()
+        self._close_stage(now)
+        self.stage = stage
+        self.stages.append([stage, now, None])
+
+    def finish(self, result=None, error=None):
+        now = time.time()
+        self._close_stage(now)
+        self.finished_at = now
+        self.result = result
+        self.error = error
+        self.status = 'failed' if error is not None else 'done'
+
+    def _close_stage(self, now):
+        if self.stages and self.stages[-1][2] is None:
+            self.stages[-1][2] = round(now - self.stages[-1][1], 4)
+
+    def to_dict(self):
+        # 快取命中時會跳過部分階段，因此進度以目前階段在 STAGES 中的位置計算
+        if self.status == 'done':
+            progress = 1.0
+        elif self.stage in STAGES:
+            progress = round(STAGES.index(self.stage) / len(STAGES), 2)
+        else:
+            progress = 0.0
+        return {
+            'id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': progress,
+            'stages': [{'name': name, 'seconds': seconds} for name, _, seconds in self.stages],
+            'elapsed': round((self.finished_at or time.time()) - self.created_at, 3),
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class JobQueue:
+    """
+    run(options, progress) 為實際執行工作的函式，在執行緒池中呼叫：
+    每進入一個階段就呼叫 progress(階段名稱)，回傳可轉為 JSON 的結果 dict；
+    拋出 ValueError 時訊息會直接作為錯誤訊息，其他例外則加上「處理失敗」前綴。
+    max_pending 為排隊中與執行中工作數量的上限，達到上限時 submit 拋出 QueueFull；
+    max_jobs 為保留供查詢的已結束工作數量上限。
+    shared_cache 若有提供，工作狀態會寫入其 namespace 命名空間。
+    """
+    def __init__(self, run, max_workers=2, ttl=600, max_jobs=200, max_pending=20, shared_cache=None,
+                 namespace='jobs'):
+        self.run = run
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self.max_pending = max_pending
+        self.shared_cache = shared_cache
+        self.namespace = namespace
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.submitted = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        # 執行緒池不能跨 fork 使用，每個 worker 行程各自建立
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='render-job')
+            self._pid = os.getpid()
+            self._jobs = OrderedDict()
+        return self._executor
+
+    def submit(self, options):
+        """建立工作並排入佇列，立即回傳工作編號；排隊中與執行中的工作已達上限時拋出 QueueFull"""
+        job = Job(uuid.uuid4().hex)
+        with self._lock:
+            executor = self._get_executor()
+            self._prune()
+            if sum(1 for queued in self._jobs.values() if queued.finished_at is None) >= self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f"目前已有 {self.max_pending} 個工作在處理中，請稍後再試。")
+            self._jobs[job.id] = job
+            self.submitted += 1
+        self._publish(job)
+        executor.submit(self._execute, job, options)
+        return job.id
+
+    def get(self, job_id):
+        """回傳工作狀態 dict；本行程沒有這個工作時改查共用磁碟快取，都找不到時回傳 None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job.to_dict()
+        data = self.shared_cache.get(self.namespace, job_id) if self.shared_cache else None
+        return json.loads(data) if data is not None else None
+
+    def _execute(self, job, options):
+        def progress(stage):
+            with self._lock:
+                job.enter(stage)
+            self._publish(job)
+
+        with self._lock:
+            job.status = 'running'
+        try:
+            result = self.run(options, progress)
+            error = None
+        except ValueError as e:
+            result, error = None, str(e)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            result, error = None, f"處理失敗: {e}"
+        with self._lock:
+            job.finish(result, error)
+            if error is not None:
+                self.failed += 1
+        self._publish(job)
+
+    def _publish(self, job):
+        if self.shared_cache:
+            with self._lock:
+                data = json.dumps(job.to_dict(), ensure_ascii=False)
+            self.shared_cache.set(self.namespace, job.id, data.encode('utf-8'))
+
+    def _prune(self):
+        """移除已結束且超過存活時間的工作；已結束的工作超過 max_jobs 個時由最舊的開始移除"""
+        now = time.time()
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        excess = len(finished) - self.max_jobs
+        for job_id in finished:
+            if excess > 0 or now - self._jobs[job_id].finished_at > self.ttl:
+                del self._jobs[job_id]
+                excess -= 1
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            'submitted': self.submitted,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'queued': statuses.count('queued'),
+            'running': statuses.count('running'),
+            'tracked': len(statuses),
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+        }
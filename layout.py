@@ -0,0 +1,362 @@
+"""
+分層排版引擎。
+排版分為兩個步驟：先量測出版面計畫（LayoutPlan：標題模式與分行、內文行數、圖片區域、圖說位置），
+不做任何繪圖；再依計畫繪製標題、內文、圖片與圖說四個圖層。
+標題與內文圖層以文字為鍵快取，圖片圖層沿用縮放後的圖片快取，圖說沿用 CaptionRenderer 的圖塊快取；
+除圖說以外合成好的底圖也另外快取，只修改圖說文字時只需複製底圖再貼上圖說。
+"""
+import math
+
+from PIL import Image, ImageDraw
+
+from fonts import get_line_breaker
+from timing import NULL_TIMER
+
+# 圖片網址的無效值（擷取不到圖片時文章紀錄中的文字）
+NO_IMAGE = '未找到圖片'
+# 圖說文字的無效值：單張圖片模式不繪製，雙框圖片模式改用「圖X跟圖X」
+NO_ALT_TEXT = '未找到圖片或無替代文字'
+DUAL_NO_ALT_TEXTS = ('無替代文字', NO_ALT_TEXT)
+
+
+def _no_progress(stage):
+    pass
+
+
+class LayoutPlan:
+    """量測結果。座標都是畫布上的絕對位置；image_box 為 (x, y, 寬, 高)"""
+    __slots__ = ('title', 'title_mode', 'title_lines', 'title_font_size', 'content', 'content_lines',
+                 'content_ellipsis', 'cramped', 'image_box', 'image_mode', 'image_urls', 'image_labels',
+                 'caption', 'caption_xy', 'caption_needs_image')
+
+    def base_key(self):
+        """除圖說以外的所有繪圖輸入，相同的鍵得到相同的底圖"""
+        return (self.title, self.content, self.image_mode, tuple(self.image_urls), tuple(self.image_labels))
+
+
+class LayoutEngine:
+    """
+    cfg 為 LAYOUT_CONFIG；get_font(size)、get_source_font() 取得字體；
+    fetch_images(網址列表, (寬, 高)) 回傳縮放好的圖片（失敗為 None）；
+    background 為 assets.BackgroundTemplate，caption_renderer 為 assets.CaptionRenderer；
+    measure_cache、layer_cache 與 base_cache 為 LRUCache，分別保存標題與內文的量測結果、文字圖層與不含圖說的底圖；
+    fingerprint() 回傳版面設定與素材檔案的指紋，變更後舊的快取項目不再使用。
+    """
+    def __init__(self, cfg, get_font, get_source_font, fetch_images, background, caption_renderer,
+                 measure_cache, layer_cache, base_cache, fingerprint):
+        self.cfg = cfg
+        self.get_font = get_font
+        self.get_source_font = get_source_font
+        self.fetch_images = fetch_images
+        self.background = background
+        self.caption_renderer = caption_renderer
+        self.measure_cache = measure_cache
+        self.layer_cache = layer_cache
+        self.base_cache = base_cache
+        self.fingerprint = fingerprint
+
+    # --- 量測 ---
+
+    def plan(self, data, show_source=True, dual_image_data=None, fingerprint=None):
+        """計算版面計畫，不繪圖（圖說位置需要字體量測，但不需要圖片）"""
+        cfg = self.cfg
+        layout_cfg, image_cfg = cfg['layout'], cfg['image']
+        start_x = layout_cfg['white_area_left']
+        white_area_width = layout_cfg['white_area_width']
+        plan = LayoutPlan()
+
+        # 標題與內文的斷行是量測中最耗時的部分，各自以文字為鍵快取
+        fingerprint = fingerprint or self.fingerprint()
+        plan.title = data.get('title', '未找到標題')
+        plan.content = data.get('content', '未找到內容')
+        plan.title_mode, plan.title_lines, plan.title_font_size = self._cached(
+            self.measure_cache, (fingerprint, 'title', plan.title), lambda: self._measure_title(plan.title))
+        plan.content_lines, plan.content_ellipsis, plan.cramped, image_y, image_height = self._cached(
+            self.measure_cache, (fingerprint, 'content', plan.content), lambda: self._measure_content(plan.content))
+        plan.image_box = (start_x, image_y, white_area_width, image_height)
+
+        # 圖片與圖說
+        plan.caption = None
+        plan.caption_needs_image = False
+        if dual_image_data:
+            plan.image_mode = 'dual'
+            plan.image_urls = [dual_image_data.get('img1_url'), dual_image_data.get('img2_url')]
+            plan.image_labels = [dual_image_data.get('img1_idx'), dual_image_data.get('img2_idx')]
+            if show_source:
+                # 優先使用第一張圖的 alt_text，如果不存在則使用 "圖X跟圖X" 作為備用
+                caption = dual_image_data.get('alt_text')
+                if not caption or caption in DUAL_NO_ALT_TEXTS:
+                    caption = f"圖{plan.image_labels[0]}跟圖{plan.image_labels[1]}"
+                plan.caption = caption
+        else:
+            image_url = data.get('image_url', '')
+            plan.image_labels = []
+            if image_url and image_url != NO_IMAGE:
+                plan.image_mode = 'single'
+                plan.image_urls = [image_url]
+                alt_text = data.get('alt_text', '')
+                # 只有當「顯示資料來源」被勾選，且有實際的 alt_text 時才繪製，圖片載入失敗時也不繪製
+                if show_source and alt_text and alt_text != NO_ALT_TEXT:
+                    plan.caption = alt_text
+                    plan.caption_needs_image = True
+            else:
+                plan.image_mode = 'none'
+                plan.image_urls = []
+
+        plan.caption_xy = None
+        if plan.caption is not None:
+            left, top, right, bottom = self.get_source_font().getbbox(plan.caption)
+            plan.caption_xy = (start_x + white_area_width - (right - left) - image_cfg['source_text_horizontal_margin'],
+                               image_y + image_height - (bottom - top) - image_cfg['source_text_vertical_margin'])
+        return plan
+
+    def _text_width(self):
+        return self.cfg['layout']['white_area_width'] - self.cfg['title']['horizontal_padding']
+
+    def _measure_title(self, title):
+        """
+        回傳 (標題模式, 各行, 字體大小)：基本字體下只有一行時為 single（放大並垂直拉伸），
+        否則為 multi（最多顯示兩行）
+        """
+        title_cfg = self.cfg['title']
+        text_width = self._text_width()
+        title_lines = get_line_breaker(self.get_font(title_cfg['base_font_size'])).wrap(title, text_width)
+        if len(title_lines) == 1:
+            return 'single', tuple(title_lines), self._single_line_font_size(title_lines[0], text_width)
+        return 'multi', tuple(title_lines[:2]), title_cfg['base_font_size']
+
+    def _measure_content(self, content):
+        """
+        回傳 (顯示的各行, 是否加上刪節號, 是否為擁擠版面, 圖片區域 y, 圖片區域高度)。
+        先以全部行數計算剩下給圖片的高度，不足時改為擁擠版面，內文最多顯示固定行數。
+        """
+        cfg = self.cfg
+        layout_cfg, content_cfg, image_cfg = cfg['layout'], cfg['content'], cfg['image']
+        content_lines = get_line_breaker(self.get_font(content_cfg['font_size'])).wrap(content, self._text_width())
+        body_top = layout_cfg['white_area_top'] + layout_cfg['header_height']
+        white_bottom = layout_cfg['white_area_top'] + layout_cfg['white_area_height']
+
+        def image_top(line_count):
+            return (body_top + content_cfg['top_padding'] + line_count * content_cfg['line_height']
+                    + content_cfg['bottom_padding'] + layout_cfg['content_image_gap'])
+
+        image_y = image_top(len(content_lines))
+        image_height = max(image_cfg['min_height'], white_bottom - image_y)
+        cramped = image_height < image_cfg['min_height_for_full_content']
+        ellipsis = False
+        if cramped:
+            max_lines = min(len(content_lines), content_cfg['max_lines_when_cramped'])
+            ellipsis = len(content_lines) > max_lines
+            content_lines = content_lines[:max_lines]
+            image_y = image_top(max_lines)
+            image_height = white_bottom - image_y
+        return tuple(content_lines), ellipsis, cramped, image_y, image_height
+
+    def _single_line_font_size(self, text, available_width):
+        """單行標題在初始字體大小下太短時放大字體，填滿可用寬度（不超過 max_font_size）"""
+        title_cfg = self.cfg['title']
+        left, _, right, _ = self.get_font(title_cfg['base_font_size']).getbbox(text)
+        target_width = available_width * title_cfg['single_line']['fill_percentage']
+        if right - left < target_width:
+            scale_factor = target_width / (right - left)
+            return min(int(title_cfg['base_font_size'] * scale_factor), title_cfg['max_font_size'])
+        return title_cfg['base_font_size']
+
+    # --- 繪製 ---
+
+    def render(self, data, show_source=True, dual_image_data=None, timer=NULL_TIMER, progress=_no_progress):
+        """
+        量測並繪製排版圖，回傳 (可自由修改的 RGB 圖片, 所有圖片是否都成功載入)；
+        背景底圖無法載入時圖片為 None。圖片由 fetch_images 取得，底圖取自快取時不需要圖片。
+        timer 依序記錄 measure、download、background、title、content、image、caption 的耗時；
+        底圖取自快取時只有 measure、background 與 caption。
+        下載圖片（download）與開始繪製（render）前會呼叫 progress。
+        """
+        fingerprint = self.fingerprint()
+        plan = self.plan(data, show_source, dual_image_data, fingerprint)
+        timer.mark('measure')
+
+        base_key = (fingerprint, plan.base_key())
+        base = self.base_cache.get(base_key)
+        if base is not None:
+            progress('render')
+            canvas = base.copy()
+            timer.mark('background')
+            images_loaded = [True] * len(plan.image_urls)
+        else:
+            progress('download')
+            images = self._fetch_images(plan)
+            timer.mark('download')
+            progress('render')
+            canvas = self._background()
+            if canvas is None:
+                return None, False
+            timer.mark('background')
+            self._paste_layer(canvas, self._title_layer(fingerprint, plan))
+            timer.mark('title')
+            if plan.cramped:
+                # 擁擠版面時內文區域以下整塊改為白底，蓋掉超出標題區的拉伸標題
+                layout_cfg = self.cfg['layout']
+                x, _, width, _ = plan.image_box
+                ImageDraw.Draw(canvas).rectangle(
+                    [x, layout_cfg['white_area_top'] + layout_cfg['header_height'],
+                     x + width, layout_cfg['white_area_top'] + layout_cfg['white_area_height']], fill='white')
+            self._paste_layer(canvas, self._content_layer(fingerprint, plan))
+            timer.mark('content')
+            images_loaded = self._paint_images(canvas, plan, images)
+            timer.mark('image')
+            # 圖片載入失敗時不快取，之後的請求可以重新下載
+            if all(images_loaded):
+                self.base_cache.set(base_key, canvas.copy())
+
+        if plan.caption is not None and (not plan.caption_needs_image or all(images_loaded)):
+            self.caption_renderer.paste(canvas, plan.caption_xy, plan.caption, self.get_source_font(),
+                                        self.cfg['image']['source_text_stroke_width'])
+        timer.mark('caption')
+        return canvas, all(images_loaded)
+
+    def _background(self):
+        layout_cfg = self.cfg['layout']
+        try:
+            return self.background.get(layout_cfg)
+        except FileNotFoundError:
+            print(f"警告: 找不到背景圖片 {layout_cfg['background_path']}，已使用白色背景替代。")
+            return Image.new('RGB', (layout_cfg['width'], layout_cfg['height']), color='white')
+        except Exception as e:
+            print(f"錯誤: 背景圖片載入失敗: {e}")
+            return None
+
+    @staticmethod
+    def _paste_layer(canvas, layer):
+        image, xy = layer
+        if image is not None:
+            canvas.paste(image, xy, image)
+
+    @staticmethod
+    def _cached(cache, key, build):
+        value = cache.get(key)
+        if value is None:
+            value = build()
+            cache.set(key, value)
+        return value
+
+    def _title_layer(self, fingerprint, plan):
+        return self._cached(self.layer_cache, (fingerprint, 'title', plan.title), lambda: self._build_title_layer(plan))
+
+    def _content_layer(self, fingerprint, plan):
+        return self._cached(self.layer_cache, (fingerprint, 'content', plan.content),
+                            lambda: self._build_content_layer(plan))
+
+    def _build_title_layer(self, plan):
+        cfg = self.cfg
+        layout_cfg, title_cfg = cfg['layout'], cfg['title']
+        start_x = layout_cfg['white_area_left']
+        header_top = layout_cfg['white_area_top']
+        header_height = layout_cfg['header_height']
+
+        if plan.title_mode == 'multi':
+            line_height = title_cfg['base_font_size'] * title_cfg['line_height_multiplier']
+            y = header_top + title_cfg['vertical_offset_multiline']
+            lines = [(start_x + title_cfg['horizontal_padding'] / 2, y + i * line_height, line)
+                     for i, line in enumerate(plan.title_lines)]
+            return self._text_layer(lines, self.get_font(plan.title_font_size))
+
+        s_cfg = title_cfg['single_line']
+        text = plan.title_lines[0]
+        font = self.get_font(plan.title_font_size)
+        left, top, right, bottom = font.getbbox(text)
+        text_width, text_height = right - left, bottom - top
+        white_area_width = layout_cfg['white_area_width']
+        if text_height <= 0:
+            x = start_x + (white_area_width - text_width) // 2
+            y = (header_top + s_cfg['vertical_offset']) + (header_height - text_height) // 2
+            return self._text_layer([(x, y, text)], font)
+
+        # 先畫在透明圖上，再只在垂直方向拉伸（不超過標題區高度的 max_stretch_factor 倍）
+        stretched_height = min(int(text_height * s_cfg['vertical_stretch_factor']),
+                               int(header_height * s_cfg['max_stretch_factor']))
+        padding_h, padding_v = s_cfg['temp_image_padding_h'], s_cfg['temp_image_padding_v']
+        sprite = Image.new('RGBA', (text_width + padding_h, text_height + padding_v), (255, 255, 255, 0))
+        ImageDraw.Draw(sprite).text((padding_h // 2, padding_v // 2), text, font=font, fill='black')
+        sprite = sprite.resize((sprite.width, int(stretched_height + padding_v)), Image.Resampling.LANCZOS)
+        x = start_x + (white_area_width - sprite.width) // 2
+        y = (header_top + s_cfg['vertical_offset']) + (header_height - sprite.height) // 2
+        return sprite, (x, y)
+
+    def _build_content_layer(self, plan):
+        cfg = self.cfg
+        content_cfg = cfg['content']
+        x = cfg['layout']['white_area_left'] + cfg['title']['horizontal_padding'] / 2
+        y = cfg['layout']['white_area_top'] + cfg['layout']['header_height'] + content_cfg['top_padding']
+        lines = list(plan.content_lines) + (['...'] if plan.content_ellipsis else [])
+        return self._text_layer([(x, y + i * content_cfg['line_height'], line) for i, line in enumerate(lines)],
+                                self.get_font(content_cfg['font_size']))
+
+    def _text_layer(self, lines, font):
+        """
+        將 [(x, y, 文字)] 畫在透明圖層上並裁切到實際有筆畫的範圍，回傳 (圖層, 畫布座標)。
+        底色為透明黑，貼回畫布時的結果與直接在畫布上以黑字繪製相同。
+        """
+        if not lines:
+            return None, (0, 0)
+        size = getattr(font, 'size', 10)
+        # 圖層原點取整數，保留文字座標的小數部分，字形的次像素位置才會與直接繪製一致
+        origin_x = math.floor(min(x for x, _, _ in lines)) - size
+        origin_y = math.floor(min(y for _, y, _ in lines)) - size
+        width = int(max(x + font.getlength(text) for x, _, text in lines) - origin_x) + 2 * size
+        height = int(max(y for _, y, _ in lines) - origin_y) + 3 * size
+        layer = Image.new('RGBA', (max(width, 1), max(height, 1)), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(layer)
+        for x, y, text in lines:
+            draw.text((x - origin_x, y - origin_y), text, font=font, fill='black')
+        bbox = layer.getbbox()
+        if bbox is None:
+            return None, (0, 0)
+        return layer.crop(bbox), (origin_x + bbox[0], origin_y + bbox[1])
+
+    def _dual_image_width(self, plan):
+        return (plan.image_box[2] - self.cfg['image']['dual_image_gap']) // 2
+
+    def _fetch_images(self, plan):
+        """依版面計畫取得縮放好的圖片（失敗為 None），沒有圖片時回傳空列表"""
+        _, _, width, height = plan.image_box
+        if plan.image_mode == 'dual':
+            return self.fetch_images(plan.image_urls, (self._dual_image_width(plan), height))
+        if plan.image_mode == 'single':
+            return self.fetch_images(plan.image_urls, (width, height))
+        return []
+
+    def _paint_images(self, canvas, plan, images):
+        """貼上 _fetch_images 取得的圖片，載入失敗時繪製提示；回傳每張圖片是否成功載入"""
+        x, y, width, height = plan.image_box
+        draw = ImageDraw.Draw(canvas)
+        if plan.image_mode == 'dual':
+            gap = self.cfg['image']['dual_image_gap']
+            img_width = self._dual_image_width(plan)
+            for i, (image, label) in enumerate(zip(images, plan.image_labels)):
+                left = x + i * (img_width + gap)
+                if image:
+                    canvas.paste(image, (left, y))
+                else:
+                    right = left + img_width if i == 0 else x + width
+                    draw.rectangle([left, y, right, y + height], fill='grey')
+                    draw.text((left + 20, y + 20), f"圖 {label} 載入失敗", font=self.get_font(24), fill='white')
+            return [image is not None for image in images]
+
+        if plan.image_mode == 'single':
+            image = images[0]
+            if image:
+                canvas.paste(image, (x, y))
+                return [True]
+            message = "圖片載入失敗"
+        else:
+            message = "無圖片內容"
+        font = self.get_font(32)
+        left, _, right, _ = font.getbbox(message)
+        draw.text((x + (width - (right - left)) // 2, y + height // 2 - 20), message, font=font, fill='white')
+        return [False] * len(plan.image_urls)
+
+    def clear(self):
+        self.measure_cache.clear()
+        self.layer_cache.clear()
+        self.base_cache.clear()
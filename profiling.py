@@ -0,0 +1,153 @@
+"""
+單一請求的效能剖析。
+某篇文章特別慢時，可對該次請求開啟剖析（或依比例抽樣），將結果存到本機目錄：
+- .pstats：cProfile 的確定性剖析結果，可用 python -m pstats 或 snakeviz 檢視
+- .collapsed：取樣得到的呼叫堆疊（每行「frame;frame;... 次數」），可直接交給 flamegraph.pl 或 speedscope
+- .json：網址、時間、各階段耗時等中繼資料
+兩者都只記錄處理請求的執行緒；圖片下載在下載執行緒池中進行，在這裡只會看到等待的時間。
+"""
+import cProfile
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from timing import current_timer
+
+
+class StackSampler:
+    """在背景執行緒中每隔 interval 秒記錄一次目標執行緒的呼叫堆疊"""
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """flame graph 工具使用的 collapsed stack 格式"""
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.samples.items()))
+
+
+class ProfileRun:
+    """
+    with 區塊內為剖析範圍；結束時停止剖析並寫入檔案，
+    之後可由 profile_id 與 paths 取得結果位置。
+    """
+    def __init__(self, profiler, url):
+        self.profiler = profiler
+        self.url = url
+        self.profile_id = None
+        self.paths = {}
+        self._profile = cProfile.Profile()
+        self._sampler = StackSampler(profiler.interval)
+        self._started_at = None
+        self._start = None
+
+    def __enter__(self):
+        self._started_at = time.time()
+        self._start = time.perf_counter()
+        self._sampler.start()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._profile.disable()
+        self._sampler.stop()
+        elapsed = time.perf_counter() - self._start
+        try:
+            self.profile_id, self.paths = self.profiler.save(self, elapsed)
+        except OSError as e:
+            # 剖析結果寫入失敗不應影響請求本身
+            print(f"剖析結果寫入失敗: {e}")
+        return False
+
+
+class RequestProfiler:
+    """
+    directory 為剖析結果的存放目錄；sample_rate 為未要求剖析的請求中被抽樣剖析的比例（0 表示只在要求時剖析）；
+    interval 為堆疊取樣的間隔秒數；max_profiles 為目錄中保留的剖析結果數量上限，超過時刪除最舊的。
+    """
+    def __init__(self, directory, sample_rate=0.0, interval=0.005, max_profiles=100):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+        self.profiled = 0
+
+    def should_profile(self, requested=False):
+        if not self.directory:
+            return False
+        return requested or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def profile(self, url):
+        return ProfileRun(self, url)
+
+    def save(self, run, elapsed):
+        """寫入 .pstats、.collapsed 與 .json，回傳 (profile_id, {格式: 路徑})"""
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', re.sub(r'^https?://', '', run.url or ''))[:60].strip('-') or 'request'
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(run._started_at))}-{slug}-{uuid.uuid4().hex[:8]}"
+        base = os.path.join(self.directory, profile_id)
+        paths = {'pstats': base + '.pstats', 'collapsed': base + '.collapsed', 'meta': base + '.json'}
+
+        run._profile.dump_stats(paths['pstats'])
+        with open(paths['collapsed'], 'w', encoding='utf-8') as f:
+            f.write(run._sampler.collapsed())
+        meta = {
+            'id': profile_id,
+            'url': run.url,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(run._started_at)),
+            'elapsed': round(elapsed, 4),
+            'stages': {stage: round(seconds, 4) for stage, seconds in getattr(current_timer(), 'phases', {}).items()},
+            'samples': sum(run._sampler.samples.values()),
+            'sample_interval': self.interval,
+            'pid': os.getpid(),
+        }
+        with open(paths['meta'], 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+        with self._lock:
+            self.profiled += 1
+            self._prune()
+        return profile_id, paths
+
+    def _prune(self):
+        metas = sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+        for name in metas[:max(len(metas) - self.max_profiles, 0)]:
+            base = os.path.join(self.directory, name[:-len('.json')])
+            for ext in ('.json', '.pstats', '.collapsed'):
+                try:
+                    os.remove(base + ext)
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        return {'directory': self.directory, 'sample_rate': self.sample_rate, 'profiled': self.profiled}
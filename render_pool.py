@@ -0,0 +1,47 @@
+"""
+排版圖的多行程繪製。
+create_layout_image 是受 GIL 限制的 Pillow 運算，批次繪製時改交給行程池，
+讓多張排版圖能同時使用多個 CPU 核心。
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+class RenderPool:
+    """
+    延遲建立的行程池。子行程以 spawn 方式啟動並重新匯入模組，
+    不會繼承父行程中的執行緒與連線（gunicorn worker 與圖片下載執行緒池都在父行程中）。
+    """
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+
+    def _get_executor(self):
+        # 行程池不能跨 fork 使用，每個 worker 行程各自建立
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, func, *args, **kwargs):
+        """提交繪製工作，func 必須是可由子行程匯入的模組層級函式"""
+        future = self._get_executor().submit(func, *args, **kwargs)
+        self.submitted += 1
+        return future
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        return {'max_workers': self.max_workers, 'submitted': self.submitted,
+                'started': self._executor is not None and self._pid == os.getpid()}
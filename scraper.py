@@ -1,29 +1,274 @@
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
 from urllib.parse import urljoin, urlparse
 import urllib3
 import warnings
 import re
 import io
+import json
+import sys
 from PIL import Image
+from http_client import get_http_client, DownloadAborted
+from config import HTTP_CONFIG, SCRAPER_CONFIG
+
+try:
+    import lxml.html  # lxml 為選用套件，設定使用時解析速度快很多
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+# --- 精簡解析 ---
+# 擷取邏輯只會讀取以下標籤，以及 class 含有 "content" 的內容區塊
+_EXTRACTED_TAGS = frozenset(['img', 'figure', 'article', 'main', 'body'])
+# 這些標籤會呼叫 get_text()，必須保留完整的子樹
+_TEXT_TAGS = frozenset(['h1', 'title', 'p', 'figcaption'])
+
+
+def _prune_unused_elements(element):
+    """
+    移除子樹中沒有任何擷取目標的元素，回傳此元素是否需要保留。
+    被移除的元素內不含 <img>、<p>、<figcaption> 等標籤，因此不影響
+    圖片順序、父元素與 find_next_sibling('p'/'figcaption') 的結果。
+    """
+    if element.tag in _TEXT_TAGS:
+        return True
+    keep = element.tag in _EXTRACTED_TAGS or 'content' in element.get('class', '')
+    for child in list(element):
+        if isinstance(child.tag, str) and _prune_unused_elements(child):
+            keep = True
+        else:
+            element.remove(child)
+    return keep
+
+# --- 圖片下載檢查 ---
+# Pillow 能開啟的常見圖片格式開頭位元組；不符合的內容（如錯誤的 data-src 指到 HTML 頁面）會立即中止下載
+_IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a', b'BM', b'II*\x00', b'MM\x00*')
+
+
+def _inspect_image_head(head):
+    """
+    檢查下載中的前段位元組（供 HttpClient.download 呼叫）：格式不符或像素過多時拋出 DownloadAborted，
+    辨識出尺寸後回傳 True；標頭尚未收齊時回傳 False 以繼續接收。
+    """
+    if len(head) < 12:
+        return False
+    if not (head.startswith(_IMAGE_SIGNATURES) or (head[:4] == b'RIFF' and head[8:12] == b'WEBP')):
+        raise DownloadAborted(f"不是支援的圖片格式（開頭為 {bytes(head[:8])!r}）")
+    try:
+        with warnings.catch_warnings():
+            # 尺寸由下面的 image_max_pixels 判斷，不需要 Pillow 的解壓縮炸彈警告
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            width, height = Image.open(io.BytesIO(head)).size
+    except Image.DecompressionBombError as e:
+        raise DownloadAborted(str(e))
+    except Exception:
+        # JPEG 的 EXIF 等區段可能很長；超過檢查範圍就交給下載完成後的檢查
+        return len(head) >= HTTP_CONFIG['image_sniff_bytes']
+    if width * height > HTTP_CONFIG['image_max_pixels']:
+        raise DownloadAborted(f"圖片尺寸過大（{width}x{height}）")
+    return True
+
+# --- 圖片判斷規則（預先編譯） ---
+# 網址或替代文字符合任一排除規則即不是內容圖片
+IMAGE_EXCLUDE_PATTERNS = [
+    r'logo', r'icon', r'avatar', r'ad[^a-z]', r'banner', r'button', r'arrow',
+    r'bg[^a-z]', r'background', r'_80x80', r'thumb', r'small', r'mini',
+    r'facebook', r'twitter', r'instagram', r'youtube', r'share', r'social'
+]
+# 替代文字或（小寫）網址包含任一關鍵字即視為內容圖片
+IMAGE_CONTENT_INDICATORS = ['資料照', '圖片來源', '截自', '翻攝', '中天新聞', '記者', '攝影', '.jpg', '.png', '.jpeg', '.webp']
+
+_EXCLUDE_RE = re.compile('|'.join(f'(?:{pattern})' for pattern in IMAGE_EXCLUDE_PATTERNS))
+_CONTENT_INDICATOR_RE = re.compile('|'.join(re.escape(indicator) for indicator in IMAGE_CONTENT_INDICATORS))
+_CONTENT_INDICATOR_LOWER_RE = re.compile('|'.join(re.escape(indicator.lower()) for indicator in IMAGE_CONTENT_INDICATORS))
+_CJK_RUN_RE = re.compile(r'[\u4e00-\u9fff]{2}')  # 至少兩個連續中文字（{2,4} 與 {2,} 的搜尋結果相同）
+_MAIN_SCORE_PENALTY_RE = re.compile('logo|icon|avatar|ad|banner|thumb')
+_RELEVANCE_PENALTY_RE = re.compile('logo|icon|avatar|ad|banner|thumb|small')
+_RELEVANCE_ALT_KEYWORDS_RE = re.compile('圖片來源|截自|翻攝|記者|圖／')
+_MAIN_ALT_KEYWORDS_RE = re.compile('圖|攝|翻攝|資料照')
+_CAPTION_KEYWORDS_RE = re.compile('圖|攝|取自|翻攝|資料照')
+_PARENTHESES_RES = [re.compile(pattern) for pattern in (r'（([^）]+)）', r'\(([^)]+)\)', r'【([^】]+)】', r'\[([^\]]+)\]')]
 
 # 忽略SSL警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 warnings.filterwarnings('ignore', category=urllib3.exceptions.InsecureRequestWarning)
 
+class ArticleRecord:
+    """
+    文章擷取結果的精簡紀錄，只保留繪圖所需的欄位，取代快取整棵 BeautifulSoup 樹。
+    images 為 (圖片網址, 替代文字) 的 tuple，順序與 get_all_content_images 相同。
+    """
+    __slots__ = ('url', 'title', 'content', 'image_url', 'alt_text', 'images')
+
+    def __init__(self, url, title, content, image_url, alt_text, images=()):
+        self.url = url
+        self.title = title
+        self.content = content
+        self.image_url = image_url
+        self.alt_text = alt_text
+        self.images = tuple(images)
+
+    def to_dict(self):
+        """轉成與 Scraper.get_content 相同格式的字典（另含 url）"""
+        return {
+            'title': self.title,
+            'content': self.content,
+            'image_url': self.image_url,
+            'alt_text': self.alt_text,
+            'url': self.url,
+        }
+
+    def content_images(self):
+        """轉成與 Scraper.get_all_content_images 相同格式的清單"""
+        return [{'image_url': image_url, 'alt_text': alt_text} for image_url, alt_text in self.images]
+
+    def to_json(self):
+        """序列化為 JSON 字串，供跨 worker 的共用快取使用"""
+        return json.dumps([self.url, self.title, self.content, self.image_url, self.alt_text,
+                           [list(image) for image in self.images]], ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, data):
+        url, title, content, image_url, alt_text, images = json.loads(data)
+        return cls(url, title, content, image_url, alt_text, [tuple(image) for image in images])
+
+    def estimate_bytes(self):
+        """估計此紀錄佔用的記憶體，供快取計算額度"""
+        size = sys.getsizeof(self) + sys.getsizeof(self.images)
+        for value in (self.url, self.title, self.content, self.image_url, self.alt_text):
+            size += sys.getsizeof(value)
+        for image_url, alt_text in self.images:
+            size += sys.getsizeof((image_url, alt_text)) + sys.getsizeof(image_url) + sys.getsizeof(alt_text)
+        return size
+
+
+class ImageCandidate:
+    """頁面中單一 <img> 的候選資料（見 Scraper.image_index）"""
+    __slots__ = ('img', 'position', 'src', 'alt', 'clean_alt', 'is_content', 'is_content_raw',
+                 'main_score', 'relevance_score')
+
+    def __init__(self, img, position, alt, clean_alt):
+        self.img = img
+        self.position = position
+        self.alt = alt
+        self.clean_alt = clean_alt
+        self.src = None  # 補全後的絕對網址，沒有來源網址時為 None
+        self.is_content = False
+        self.is_content_raw = False
+        self.main_score = None
+        self.relevance_score = None
+
+
+class _SiblingLookup:
+    """
+    快取每個父元素底下各標籤名稱的前後位置，
+    取代逐一走訪兄弟節點的 find_next_sibling / find_previous_sibling（結果相同）。
+    """
+    def __init__(self):
+        self._parents = {}
+
+    def _entry(self, parent):
+        entry = self._parents.get(id(parent))
+        if entry is None:
+            tags = [child for child in parent.contents if isinstance(child, Tag)]
+            positions = {id(tag): index for index, tag in enumerate(tags)}
+            entry = (parent, tags, positions, {})  # 保留 parent 參照，確保 id 不被重複使用
+            self._parents[id(parent)] = entry
+        return entry
+
+    def _nearest(self, parent, name):
+        """回傳 (下一個同名標籤索引, 上一個同名標籤索引) 兩個陣列"""
+        _, tags, _, by_name = self._entry(parent)
+        arrays = by_name.get(name)
+        if arrays is None:
+            count = len(tags)
+            next_index, prev_index = [None] * count, [None] * count
+            upcoming = None
+            for index in range(count - 1, -1, -1):
+                next_index[index] = upcoming
+                if tags[index].name == name:
+                    upcoming = index
+            previous = None
+            for index in range(count):
+                prev_index[index] = previous
+                if tags[index].name == name:
+                    previous = index
+            arrays = by_name[name] = (next_index, prev_index)
+        return arrays
+
+    def find_next(self, tag, name):
+        parent = tag.parent
+        if parent is None:
+            return None
+        _, tags, positions, _ = self._entry(parent)
+        index = self._nearest(parent, name)[0][positions[id(tag)]]
+        return tags[index] if index is not None else None
+
+    def find_previous(self, tag, name):
+        parent = tag.parent
+        if parent is None:
+            return None
+        _, tags, positions, _ = self._entry(parent)
+        index = self._nearest(parent, name)[1][positions[id(tag)]]
+        return tags[index] if index is not None else None
+
+
+def _tag_key(tag):
+    """以標籤名稱、屬性與內容組成可雜湊的鍵，與 Tag 的相等判斷 (==) 一致"""
+    attrs = tuple(sorted(
+        (name, tuple(value) if isinstance(value, list) else value) for name, value in tag.attrs.items()
+    ))
+    return (tag.name, attrs, tuple(str(child) for child in tag.contents))
+
+
 class Scraper:
     """
     一個封裝了網頁內容抓取和解析邏輯的類別。
     """
-    def __init__(self, url, soup=None):
+    def __init__(self, url, soup=None, parser=None, restricted=None):
         self.url = self._validate_url(url)
         self.base_url = f"{urlparse(self.url).scheme}://{urlparse(self.url).netloc}"
+        self.parser = parser or self.default_parser()
+        self.restricted = SCRAPER_CONFIG['restricted_parse'] if restricted is None else restricted
+        self._image_index = None
         if soup:
             self.soup = soup
         else:
             self.soup = self._get_soup()
 
-    def _validate_url(self, url):
+    @classmethod
+    def from_html(cls, url, html, parser=None, restricted=None):
+        """以已下載的 HTML 建立 Scraper，解析方式與直接以網址建立時相同"""
+        parser = parser or cls.default_parser()
+        restricted = SCRAPER_CONFIG['restricted_parse'] if restricted is None else restricted
+        return cls(url, soup=cls.parse_html(html, parser, restricted), parser=parser, restricted=restricted)
+
+    @staticmethod
+    def default_parser():
+        """依設定選擇 BeautifulSoup 解析器（預設 html.parser）；'auto' 時有安裝 lxml 就使用 lxml"""
+        parser = SCRAPER_CONFIG['parser']
+        if parser == 'auto':
+            return 'lxml' if HAS_LXML else 'html.parser'
+        return parser
+
+    @staticmethod
+    def parse_html(html, parser='html.parser', restricted=False):
+        """
+        將 HTML 字串解析為 BeautifulSoup 物件。
+        restricted=True 且使用 lxml 時只建立擷取邏輯會用到的元素：先以 lxml 解析並剪除
+        無關的子樹，再把剩下的結構交給 BeautifulSoup。html.parser 一律完整解析。
+        """
+        if restricted and parser == 'lxml' and html.strip():
+            try:
+                root = lxml.html.document_fromstring(html)
+            except (ValueError, lxml.etree.LxmlError):
+                # 例如帶有 XML 編碼宣告的字串，改用完整解析
+                return BeautifulSoup(html, parser)
+            _prune_unused_elements(root)
+            html = lxml.html.tostring(root, encoding='unicode')
+        return BeautifulSoup(html, parser)
+
+    @staticmethod
+    def _validate_url(url):
         """驗證網址格式，如果沒有 scheme 則自動加上 https://"""
         parsed = urlparse(url)
         if not parsed.scheme:
@@ -32,6 +277,11 @@ class Scraper:
 
     def _get_soup(self):
         """發送請求並獲取 BeautifulSoup 物件"""
+        return self.parse_html(self.fetch_html(self.url), self.parser, self.restricted)
+
+    @staticmethod
+    def fetch_html(url):
+        """發送請求並獲取網頁 HTML 字串"""
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
@@ -40,9 +290,10 @@ class Scraper:
             'Connection': 'keep-alive',
             'Cache-Control': 'no-cache'
         }
-        response = requests.get(self.url, headers=headers, verify=False, timeout=20, allow_redirects=True)
+        response = get_http_client().get(url, headers=headers, verify=False, allow_redirects=True,
+                                         read_timeout=HTTP_CONFIG['page_read_timeout'])
         response.raise_for_status()
-        return BeautifulSoup(response.content.decode('utf-8', 'ignore'), 'html.parser')
+        return response.content.decode('utf-8', 'ignore')
 
     def get_content(self):
         """提取網頁主要內容（標題、內文、主圖）"""
@@ -60,6 +311,13 @@ class Scraper:
             'alt_text': image_data['alt_text']
         }
 
+    def extract_record(self):
+        """一次執行所有擷取邏輯，回傳可快取的 ArticleRecord"""
+        content = self.get_content()
+        images = [(image['image_url'], image['alt_text']) for image in self.get_all_content_images()]
+        return ArticleRecord(self.url, content['title'], content['content'],
+                             content['image_url'], content['alt_text'], images)
+
     def extract_title(self):
         """提取標題"""
         h1_tags = self.soup.find_all('h1')
@@ -106,43 +364,74 @@ class Scraper:
         content_area = self.soup
         for selector in content_selectors:
             area = self.soup.select_one(selector)
-            if area and area.find_all('img'):
+            if area and area.find('img'):
                 content_area = area
                 break
         
-        images = content_area.find_all('img')
+        candidates = self._candidates_in(content_area)
         found_images = []
+        seen = set()
         
-        for img in images:
-            src = self._get_image_src(img)
-            if not src: continue
-
-            if not src.startswith(('http://', 'https://')):
-                src = urljoin(self.base_url, src)
-
-            alt = self._get_image_alt_text(img)
-            
-            if self._is_content_image(src, alt):
-                if not any(d['image_url'] == src for d in found_images):
-                    clean_alt = self._clean_alt_text(alt)
-                    found_images.append({'image_url': src, 'alt_text': clean_alt})
+        for candidate in candidates:
+            if candidate.src and candidate.is_content and candidate.src not in seen:
+                seen.add(candidate.src)
+                found_images.append({'image_url': candidate.src, 'alt_text': candidate.clean_alt})
         
-        if not found_images and images:
-            for img in images:
-                src = self._get_image_src(img)
-                if not src: continue
-                if not src.startswith(('http://', 'https://')):
-                    src = urljoin(self.base_url, src)
-                if 'storage.ctinews.com' in src or 'ctinews.com' in src:
-                    alt = self._get_image_alt_text(img)
-                    clean_alt = self._clean_alt_text(alt)
-                    if not any(d['image_url'] == src for d in found_images):
-                        found_images.append({'image_url': src, 'alt_text': clean_alt})
+        if not found_images:
+            for candidate in candidates:
+                src = candidate.src
+                if src and ('storage.ctinews.com' in src or 'ctinews.com' in src) and src not in seen:
+                    seen.add(src)
+                    found_images.append({'image_url': src, 'alt_text': candidate.clean_alt})
         
         return found_images
 
     # --- Helper Methods (Private) ---
 
+    @property
+    def image_index(self):
+        """整頁 <img> 的候選資料，只在第一次使用時建立一次"""
+        if self._image_index is None:
+            self._image_index = self._build_image_index()
+        return self._image_index
+
+    def _build_image_index(self):
+        """
+        單次走訪所有 <img>，計算網址、替代文字、是否為內容圖片與兩種評分，
+        供所有主圖選取策略與 get_all_content_images 共用。
+        """
+        candidates = []
+        first_positions = {}
+        siblings = _SiblingLookup()
+        for position, img in enumerate(self.soup.find_all('img')):
+            # 舊版以 list.index(img) 取得位置，屬性完全相同的 <img> 會得到第一次出現的位置
+            first_position = first_positions.setdefault(_tag_key(img), position)
+
+            raw_src = self._get_image_src(img)
+            alt = self._get_image_alt_text(img, siblings)
+            candidate = ImageCandidate(img, position, alt, self._clean_alt_text(alt))
+            candidates.append(candidate)
+            if not raw_src:
+                continue
+
+            src = raw_src
+            if not src.startswith(('http://', 'https://')):
+                src = urljoin(self.base_url, src)
+            candidate.src = src
+            candidate.is_content = self._is_content_image(src, alt)
+            # 方法2 以尚未補全的原始網址判斷是否為內容圖片
+            candidate.is_content_raw = candidate.is_content if src == raw_src else self._is_content_image(raw_src, alt)
+            candidate.main_score = self._calculate_main_image_score(img, src, alt, first_position)
+            candidate.relevance_score = self._calculate_improved_relevance_score(img, src, alt, first_position)
+        return candidates
+
+    def _candidates_in(self, area):
+        """依文件順序回傳某個區域內 <img> 的候選資料"""
+        if area is self.soup:
+            return self.image_index
+        by_tag = {id(candidate.img): candidate for candidate in self.image_index}
+        return [by_tag[id(img)] for img in area.find_all('img')]
+
     def _find_first_content_image(self):
         """方法1：找到文章內容區域的第一張有意義圖片"""
         content_selectors = [
@@ -156,76 +445,59 @@ class Scraper:
                 content_area = area
                 break
         
-        for img in content_area.find_all('img'):
-            src = self._get_image_src(img)
-            if not src: continue
-            if not src.startswith(('http://', 'https://')):
-                src = urljoin(self.base_url, src)
-            
-            alt = self._get_image_alt_text(img)
-            if self._is_content_image(src, alt):
-                return {'image_url': src, 'alt_text': self._clean_alt_text(alt)}
+        for candidate in self._candidates_in(content_area):
+            if candidate.src and candidate.is_content:
+                return {'image_url': candidate.src, 'alt_text': candidate.clean_alt}
         return None
 
     def _find_by_image_characteristics(self):
         """方法2：根據圖片特徵判斷主圖"""
-        candidates = []
-        for img in self.soup.find_all('img'):
-            src = self._get_image_src(img)
-            alt = self._get_image_alt_text(img)
-            if not src or not self._is_content_image(src, alt): continue
-            if not src.startswith(('http://', 'https://')):
-                src = urljoin(self.base_url, src)
-            
-            score = self._calculate_main_image_score(img, src, alt)
-            candidates.append({'image_url': src, 'alt_text': self._clean_alt_text(alt), 'score': score})
-        
+        candidates = [c for c in self.image_index if c.src and c.is_content_raw]
         if candidates:
-            best = max(candidates, key=lambda x: x['score'])
-            return {'image_url': best['image_url'], 'alt_text': best['alt_text']}
+            best = max(candidates, key=lambda c: c.main_score)
+            return {'image_url': best.src, 'alt_text': best.clean_alt}
         return None
 
     def _find_by_improved_scoring(self):
         """方法3：使用改進的評分系統"""
         best_image, best_score = None, -999
-        for img in self.soup.find_all('img'):
-            src = self._get_image_src(img)
-            if not src: continue
-            if not src.startswith(('http://', 'https://')):
-                src = urljoin(self.base_url, src)
-            
-            alt = self._get_image_alt_text(img)
-            score = self._calculate_improved_relevance_score(img, src, alt)
-            if score > best_score:
-                best_score = score
-                best_image = {'image_url': src, 'alt_text': self._clean_alt_text(alt)}
+        for candidate in self.image_index:
+            if candidate.src and candidate.relevance_score > best_score:
+                best_score = candidate.relevance_score
+                best_image = {'image_url': candidate.src, 'alt_text': candidate.clean_alt}
         return best_image
 
-    def _get_image_alt_text(self, img):
-        """獲取圖片的替代文字"""
+    def _get_image_alt_text(self, img, siblings=None):
+        """獲取圖片的替代文字（siblings 為 _SiblingLookup，用於批次處理時加速兄弟節點查詢）"""
         alt_text = img.get('alt', '').strip()
         if alt_text: return alt_text
         
+        if siblings is None:
+            find_next = lambda tag, name: tag.find_next_sibling(name)
+            find_previous = lambda tag, name: tag.find_previous_sibling(name)
+        else:
+            find_next, find_previous = siblings.find_next, siblings.find_previous
+        
         parent = img.parent
         if parent and parent.name == 'figure':
             figcaption = parent.find('figcaption')
             if figcaption and figcaption.get_text().strip(): return figcaption.get_text().strip()
             
-            next_p = parent.find_next_sibling('p')
+            next_p = find_next(parent, 'p')
             if next_p:
                 style = next_p.get('style', '')
                 p_text = next_p.get_text().strip()
                 if ('text-align:center' in style or 'text-align: center' in style) and p_text: return p_text
-                if p_text and any(keyword in p_text for keyword in ['圖', '攝', '取自', '翻攝', '資料照']): return p_text
+                if p_text and _CAPTION_KEYWORDS_RE.search(p_text): return p_text
         
         if parent:
-            next_sibling = img.find_next_sibling('figcaption')
+            next_sibling = find_next(img, 'figcaption')
             if next_sibling and next_sibling.get_text().strip(): return next_sibling.get_text().strip()
             
-            prev_sibling = img.find_previous_sibling('figcaption')
+            prev_sibling = find_previous(img, 'figcaption')
             if prev_sibling and prev_sibling.get_text().strip(): return prev_sibling.get_text().strip()
             
-            parent_next = parent.find_next_sibling('figcaption')
+            parent_next = find_next(parent, 'figcaption')
             if parent_next and parent_next.get_text().strip(): return parent_next.get_text().strip()
             
         return ''
@@ -242,39 +514,29 @@ class Scraper:
     @staticmethod
     def _is_content_image(src, alt):
         """判斷是否為內容圖片"""
-        exclude_patterns = [
-            r'logo', r'icon', r'avatar', r'ad[^a-z]', r'banner', r'button', r'arrow', 
-            r'bg[^a-z]', r'background', r'_80x80', r'thumb', r'small', r'mini',
-            r'facebook', r'twitter', r'instagram', r'youtube', r'share', r'social'
-        ]
-        src_lower, alt_lower = src.lower(), alt.lower()
-        if any(re.search(p, src_lower) or re.search(p, alt_lower) for p in exclude_patterns):
+        src_lower = src.lower()
+        if _EXCLUDE_RE.search(src_lower) or _EXCLUDE_RE.search(alt.lower()):
             return False
         
-        content_indicators = ['資料照', '圖片來源', '截自', '翻攝', '中天新聞', '記者', '攝影', '.jpg', '.png', '.jpeg', '.webp']
-        if any(indicator in alt or indicator.lower() in src_lower for indicator in content_indicators):
+        if _CONTENT_INDICATOR_RE.search(alt) or _CONTENT_INDICATOR_LOWER_RE.search(src_lower):
             return True
         
         if alt and 10 <= len(alt) <= 200: return True
         if 'storage.ctinews.com' in src: return True
         return False
 
-    def _calculate_main_image_score(self, img, src, alt):
-        """計算主圖相關性分數"""
+    def _calculate_main_image_score(self, img, src, alt, position):
+        """計算主圖相關性分數（position 為圖片在整頁 <img> 中的位置）"""
         score = 0
-        all_images = self.soup.find_all('img')
-        try:
-            position = list(all_images).index(img)
-            if position <= 5: score += [50, 30, 20, 10, 10, 10][position]
-            else: score -= position * 2
-        except ValueError: pass
+        if position <= 5: score += [50, 30, 20, 10, 10, 10][position]
+        else: score -= position * 2
         
         if alt:
             if '資料照' in alt or '中天新聞' in alt: score += 40
-            if re.search(r'[\u4e00-\u9fff]{2,4}', alt): score += 20
+            if _CJK_RUN_RE.search(alt): score += 20
             if 15 <= len(alt) <= 100: score += 15
             elif len(alt) > 100: score += 5
-            if len(alt) > 50 and any(k in alt for k in ['圖', '攝', '翻攝', '資料照']): score += 25
+            if len(alt) > 50 and _MAIN_ALT_KEYWORDS_RE.search(alt): score += 25
         
         if 'storage.ctinews.com' in src:
             score += 30
@@ -293,40 +555,37 @@ class Scraper:
                 elif w >= 200 and h >= 200: score += 15
             except ValueError: pass
         
-        if any(k.lower() in src.lower() or k.lower() in alt.lower() for k in ['logo', 'icon', 'avatar', 'ad', 'banner', 'thumb']):
+        if _MAIN_SCORE_PENALTY_RE.search(src.lower()) or _MAIN_SCORE_PENALTY_RE.search(alt.lower()):
             score -= 30
         
         return score
 
-    def _calculate_improved_relevance_score(self, img, src, alt):
-        """改進版的相關性評分"""
+    def _calculate_improved_relevance_score(self, img, src, alt, position):
+        """改進版的相關性評分（position 為圖片在整頁 <img> 中的位置）"""
         score = 10
-        all_images = self.soup.find_all('img')
-        try:
-            position = list(all_images).index(img)
-            score += max(0, 40 - position * 5)
-        except ValueError: pass
+        score += max(0, 40 - position * 5)
         
         if alt:
             if '資料照／中天新聞' in alt: score += 60
             elif '資料照' in alt: score += 40
             elif '中天新聞' in alt: score += 30
-            if any(k in alt for k in ['圖片來源', '截自', '翻攝', '記者', '圖／']): score += 20
-            if re.search(r'[\u4e00-\u9fff]{2,}', alt): score += 15
+            if _RELEVANCE_ALT_KEYWORDS_RE.search(alt): score += 20
+            if _CJK_RUN_RE.search(alt): score += 15
             if len(alt) > 50: score += 10
         
         if 'storage.ctinews.com' in src:
             score += 35
             if '/compression/files/' in src: score += 15
         
-        if src.lower().endswith(('.jpg', '.jpeg', '.png')): score += 10
-        elif src.lower().endswith('.webp'): score += 5
+        src_lower = src.lower()
+        if src_lower.endswith(('.jpg', '.jpeg', '.png')): score += 10
+        elif src_lower.endswith('.webp'): score += 5
         
         loading = img.get('loading', '')
         if loading == 'eager': score += 20
         elif loading == 'lazy': score += 10
         
-        if any(p.lower() in src.lower() or p.lower() in alt.lower() for p in ['logo', 'icon', 'avatar', 'ad', 'banner', 'thumb', 'small']):
+        if _RELEVANCE_PENALTY_RE.search(src_lower) or _RELEVANCE_PENALTY_RE.search(alt.lower()):
             score -= 40
         
         return score
@@ -345,22 +604,56 @@ class Scraper:
         """提取括號內的文字"""
         if not text or text == '無替代文字': return text
         
-        patterns = [r'（([^）]+)）', r'\(([^)]+)\)', r'【([^】]+)】', r'\[([^\]]+)\]']
-        for pattern in patterns:
-            matches = re.findall(pattern, text)
+        for pattern in _PARENTHESES_RES:
+            matches = pattern.findall(text)
             if matches: return max(matches, key=len)
         
         return text[:100] + "..." if len(text) > 100 else text
 
     @staticmethod
-    def download_image(url):
-        """下載圖片並返回 PIL Image 物件"""
+    def download_image_bytes(url):
+        """
+        以串流分段下載圖片並返回原始位元組，失敗時返回 None。
+        超過大小上限，或開頭位元組不是圖片、尺寸過大時會提前中止，不會讀完整個回應。
+        """
         try:
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36'
             }
-            response = requests.get(url, headers=headers, verify=False, timeout=10)
-            response.raise_for_status()
-            return Image.open(io.BytesIO(response.content))
+            return get_http_client().download(
+                url,
+                max_bytes=HTTP_CONFIG['image_max_bytes'],
+                inspect=_inspect_image_head,
+                read_timeout=HTTP_CONFIG['image_read_timeout'],
+                chunk_size=HTTP_CONFIG['image_chunk_size'],
+                headers=headers,
+                verify=False,
+            )
+        except DownloadAborted as e:
+            print(f"警告: 中止下載圖片 {url}：{e}")
+            return None
+        except Exception:
+            return None
+
+    @staticmethod
+    def open_image(data, draft_size=None):
+        """
+        將圖片位元組轉為 PIL Image 物件，無法辨識時返回 None。
+        指定 draft_size 時，JPEG 會以 1/2、1/4 或 1/8 的比例解碼，結果仍不小於 draft_size
+        （其他格式不受影響）。
+        """
+        try:
+            image = Image.open(io.BytesIO(data))
+            if draft_size:
+                image.draft(image.mode, draft_size)
+            return image
         except Exception:
-            return None
\ No newline at end of file
+            return None
+
+    @staticmethod
+    def download_image(url, draft_size=None):
+        """下載圖片並返回 PIL Image 物件；指定 draft_size 時 JPEG 以接近該尺寸的解析度解碼"""
+        data = Scraper.download_image_bytes(url)
+        if data is None:
+            return None
+        return Scraper.open_image(data, draft_size=draft_size)
\ No newline at end of file
@@ -0,0 +1,125 @@
+"""
+跨 worker 共用的磁碟快取模組。
+gunicorn 的每個 worker 都有自己的記憶體快取，這裡以本機 SQLite 檔案讓所有 worker
+共用文章擷取紀錄與圖片原始位元組，同一篇文章或同一張圖在整個部署中只需下載一次。
+"""
+import os
+import sqlite3
+import threading
+import time
+
+
+class SharedCache:
+    """
+    以 SQLite (WAL 模式) 實作的鍵值快取，依 namespace 分別設定 TTL 與容量上限。
+    寫入皆在交易中完成，其他 worker 不會讀到寫到一半的資料。
+    """
+    def __init__(self, path, limits):
+        """limits: {namespace: {'ttl': 秒數, 'max_bytes': 位元組上限}}"""
+        self.path = path
+        self.limits = limits
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._stats_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL,"
+                " size INTEGER NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (namespace, accessed_at)")
+
+    def _connect(self):
+        """每個執行緒（以及 fork 後的每個行程）各自使用一條連線"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, namespace, key):
+        """取得快取的位元組資料，不存在或已過期時回傳 None"""
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, now),
+            ).fetchone()
+            if row is None:
+                self._count('misses')
+                return None
+            with conn:
+                conn.execute(
+                    "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (now, namespace, key),
+                )
+            self._count('hits')
+            return bytes(row[0])
+        except sqlite3.Error as e:
+            print(f"警告：共用快取讀取失敗 ({namespace}): {e}")
+            self._count('errors')
+            return None
+
+    def set(self, namespace, key, value):
+        """寫入位元組資料，並清除過期項目、依最久未使用順序淘汰超出容量的項目"""
+        limit = self.limits[namespace]
+        size = len(value)
+        if size > limit['max_bytes']:
+            return
+        now = time.time()
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (namespace, key, value, size, expires_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (namespace, key, sqlite3.Binary(value), size, now + limit['ttl'], now),
+                )
+                conn.execute("DELETE FROM entries WHERE namespace = ? AND expires_at <= ?", (namespace, now))
+                total = conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM entries WHERE namespace = ?", (namespace,)
+                ).fetchone()[0]
+                if total > limit['max_bytes']:
+                    self._evict(conn, namespace, total - limit['max_bytes'])
+        except sqlite3.Error as e:
+            print(f"警告：共用快取寫入失敗 ({namespace}): {e}")
+            self._count('errors')
+
+    @staticmethod
+    def _evict(conn, namespace, excess):
+        victims = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM entries WHERE namespace = ? ORDER BY accessed_at", (namespace,)
+        ):
+            if excess <= 0:
+                break
+            victims.append((namespace, key))
+            excess -= size
+        conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", victims)
+
+    def stats(self):
+        """回傳各 namespace 的項目數與用量，以及本行程的命中統計"""
+        result = {'path': self.path, 'hits': self.hits, 'misses': self.misses, 'errors': self.errors, 'namespaces': {}}
+        try:
+            rows = self._connect().execute(
+                "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY namespace"
+            ).fetchall()
+        except sqlite3.Error:
+            rows = []
+        for namespace, limit in self.limits.items():
+            result['namespaces'][namespace] = {'entries': 0, 'bytes': 0, **limit}
+        for namespace, count, size in rows:
+            result['namespaces'].setdefault(namespace, {}).update({'entries': count, 'bytes': size})
+        return result
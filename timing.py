@@ -0,0 +1,69 @@
+"""
+各階段耗時的記錄工具，供基準測試與效能監控使用。
+目前的計時器以 contextvars 保存：Flask 請求與背景工作各自設定自己的計時器，
+熱點程式碼以 current_timer() 取得並記錄，不需要逐層傳遞參數。
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+
+
+class PhaseTimer:
+    """
+    mark(name) 記錄從上一次 mark（或建立計時器）到現在的耗時，單位為秒；
+    同名的階段會累加。
+    """
+    def __init__(self):
+        self.phases = {}
+        self._last = time.perf_counter()
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + (now - self._last)
+        self._last = now
+
+    def restart(self):
+        """重新起算，不記錄從上一次 mark 到現在的時間"""
+        self._last = time.perf_counter()
+
+    def total(self):
+        return sum(self.phases.values())
+
+
+class _NullTimer:
+    """不需要計時時使用，mark 不做任何事"""
+    def mark(self, name):
+        pass
+
+    def restart(self):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+_current_timer = contextvars.ContextVar('phase_timer', default=NULL_TIMER)
+
+
+def current_timer():
+    """目前情境的計時器；沒有設定時回傳不記錄的 NULL_TIMER"""
+    return _current_timer.get()
+
+
+def set_timer(timer):
+    """設定目前情境的計時器，回傳可交給 reset_timer 的 token"""
+    return _current_timer.set(timer)
+
+
+def reset_timer(token):
+    _current_timer.reset(token)
+
+
+@contextmanager
+def use_timer(timer):
+    """在 with 區塊內使用 timer 作為目前情境的計時器"""
+    token = set_timer(timer)
+    try:
+        yield timer
+    finally:
+        reset_timer(token)